@@ -0,0 +1,128 @@
+"""
+Olympics Analysis Using MongoDB
+
+Scaling benchmark for the conversion / import pipeline.
+    Generates synthetic TSVs at several multiples of the real data size, runs
+    final_conversion.py and import_data.py on each, and records wall time, peak
+    memory and output size. Every run appends one JSON line per stage to the
+    results file so regressions can be tracked over time.
+
+    Usage:
+        python benchmark.py --scales 1 10 --format ndjson
+        python benchmark.py --scales 1 10 100 --skip-import     # no MongoDB needed
+"""
+from typing import List, Dict, Any, Optional
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from converting_csv.generate_synthetic import generate
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CONVERTER = os.path.join(ROOT, "converting_csv", "final_conversion.py")
+IMPORTER = os.path.join(ROOT, "import_data.py")
+COUNTRY_FILE = os.path.join(ROOT, "converting_csv", "country-information.tsv")
+DEFAULT_RESULTS = "bench_results.jsonl"
+BENCH_DB = "olympics_bench"
+
+
+def run_measured(cmd: List[str], cwd: str) -> Dict[str, Any]:
+    """
+    Runs a command and returns its wall time and peak RSS (from wait4's rusage)
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+    # Linux reports kilobytes, macOS reports bytes
+    peak = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return {"wall_s": round(wall, 3), "peak_rss_mb": round(peak, 1)}
+
+
+def path_size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_scale(scale: float, workdir: str, fmt: str, processes: int,
+                skip_import: bool, seed: int) -> List[Dict[str, Any]]:
+    """
+    Generates, converts and (optionally) imports one scale. Returns one record per stage.
+    """
+    tsv = os.path.join(workdir, "synthetic.tsv")
+    start = time.perf_counter()
+    rows = generate(tsv, scale, seed)
+    records = [{"stage": "generate", "wall_s": round(time.perf_counter() - start, 3),
+                "output_bytes": os.path.getsize(tsv)}]
+
+    output = os.path.join(workdir, "olympics.json" if fmt == "json" else "olympics_ndjson")
+    convert_cmd = [sys.executable, CONVERTER, "--inputs", tsv, "--countries", COUNTRY_FILE,
+                   "--format", fmt, "--output", output, "--processes", str(processes)]
+    if fmt == "ndjson":
+        convert_cmd.append("--gzip")
+    records.append({"stage": "convert", **run_measured(convert_cmd, workdir),
+                    "output_bytes": path_size(output)})
+
+    if not skip_import:
+        import_cmd = [sys.executable, IMPORTER, "--input", output, "--db", BENCH_DB]
+        records.append({"stage": "import", **run_measured(import_cmd, ROOT)})
+
+    for record in records:
+        record.update(scale=scale, rows=rows, format=fmt, processes=processes)
+        if record.get("wall_s"):
+            record["rows_per_s"] = round(rows / record["wall_s"])
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark conversion and import at several data scales")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10])
+    parser.add_argument("--format", choices=["json", "ndjson"], default="ndjson")
+    parser.add_argument("--processes", type=int, default=1, help="converter processes")
+    parser.add_argument("--skip-import", action="store_true", help="only generate and convert")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSON Lines file to append to")
+    args = parser.parse_args(argv)
+
+    run = {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"), "commit": git_commit()}
+    with open(args.results, "a", encoding="utf-8") as out:
+        for scale in args.scales:
+            workdir = tempfile.mkdtemp(prefix=f"olympics_bench_{scale:g}x_")
+            try:
+                for record in bench_scale(scale, workdir, args.format, args.processes,
+                                          args.skip_import, args.seed):
+                    record = {**run, **record}
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    print(f"{scale:g}x {record['stage']:>8}: {record.get('wall_s', 0):8.2f}s  "
+                          f"{record.get('peak_rss_mb', '-'):>8} MB peak  "
+                          f"{record.get('output_bytes', 0) / (1024 * 1024):8.1f} MB out")
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    if not args.skip_import:
+        from connection import get_client
+        get_client().drop_database(BENCH_DB)
+    print(f"Results appended to {args.results}")
+
+
+if __name__ == "__main__":
+    main()
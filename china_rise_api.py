@@ -9,129 +9,310 @@ China's Rise as an Olympic Superpower API:
     2. Which sports has China been most dominant in?
     3. How has China's medal count changed over time?
     4. How does China compare to other major Olympic nations?
+
+    Every question works for any NOC (get_medals, get_top_sports, get_medal_trends,
+    compare_nocs, medal_leaderboard); the get_china_* functions are the CHN slices.
+    They read the medal_cube collection: medal counts per noc × games × sport × medal
+    (with the games' year and season), built at import and updated per new Games. Its
+    size depends on countries, Games and sports, not on the number of results.
 """
-from typing import List, Dict, Any, Optional
-from pymongo import MongoClient
+from typing import List, Dict, Any, Optional, Iterable
+from pymongo.collection import Collection
+from pymongo.database import Database
+
+from connection import get_db, clear_collection
+
+# Precomputed medal counts, one document per noc × games × sport × medal
+MEDAL_CUBE = "medal_cube"
+# A cube document counts `count` medals, a raw results document counts one, so the same
+# pipelines run on either collection
+WEIGHT = {"$ifNull": ["$count", 1]}
+# Databases whose cube has been found to be built, see medal_collection()
+_cube_ready: Dict[tuple, bool] = {}
+
+
+def medal_cube_pipeline(games: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Pipeline over results that (re)computes cube cells, optionally only for some Games
+    """
+    match = [{"$match": {"games": {"$in": list(games)}}}] if games is not None else []
+    return match + [
+        {"$group": {
+            "_id": {"noc": "$noc", "games": "$games", "sport": "$sport", "medal": "$medal"},
+            # year and season are fixed by the Games
+            "year": {"$first": "$year"},
+            "season": {"$first": "$season"},
+            "count": {"$sum": 1},
+        }},
+        {"$set": {"noc": "$_id.noc", "games": "$_id.games", "sport": "$_id.sport", "medal": "$_id.medal"}},
+        {"$merge": {"into": MEDAL_CUBE, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
 
-client = MongoClient("mongodb://localhost:27017/")
-db = client["olympics"]
+
+def refresh_medal_cube(db, games: Optional[Iterable[str]] = None) -> None:
+    """
+    Rebuilds the medal cube from results: everything, or only the given Games (as an
+    incremental ingest does). A cube that was never built is always built in full, since
+    medal_collection() would otherwise prefer a cube holding only those Games.
+    """
+    if games is not None and db[MEDAL_CUBE].find_one({}, {"_id": 1}) is None:
+        games = None
+    if games is not None:
+        games = list(games)
+        db[MEDAL_CUBE].delete_many({"games": {"$in": games}})
+    else:
+        clear_collection(db, MEDAL_CUBE)
+    db.results.aggregate(medal_cube_pipeline(games))
+    _cube_ready.pop((id(db.client), db.name), None)
+
+
+def medal_collection(db: Optional[Database] = None) -> Collection:
+    """
+    The medal cube if it has been built (checked once per database), otherwise results
+    """
+    db = db if db is not None else get_db()
+    key = (id(db.client), db.name)
+    if key not in _cube_ready:
+        _cube_ready[key] = db[MEDAL_CUBE].find_one({}, {"_id": 1}) is not None
+    return db[MEDAL_CUBE] if _cube_ready[key] else db.results
+
+
+def medal_counts(group_by: Any) -> Dict[str, Any]:
+    # Count total and each medal type using conditional sums
+    return {
+        "_id": group_by,
+        "total": {"$sum": WEIGHT},
+        "gold": {"$sum": {"$cond": [{"$eq": ["$medal", "Gold"]}, WEIGHT, 0]}},
+        "silver": {"$sum": {"$cond": [{"$eq": ["$medal", "Silver"]}, WEIGHT, 0]}},
+        "bronze": {"$sum": {"$cond": [{"$eq": ["$medal", "Bronze"]}, WEIGHT, 0]}}
+    }
 
 
 def get_china_medals(
     medal_type: Optional[str] = None,
     sport: Optional[str] = None,
-    season: Optional[str] = None
+    season: Optional[str] = None,
+    db: Optional[Database] = None
 ) -> Dict[str, Any]:
     """
     Returns China's medal counts, optionally filtered by medal type, sport, and/or season.
 
-    How it works:
-    - Builds a match filter for CHN with optional medal_type, sport, and season
-    - Runs three queries: total count, breakdown by medal type, and top events
-    - Returns a combined summary dict
-
     Parameters:
         medal_type: "Gold", "Silver", or "Bronze"
         sport: e.g., "Swimming", "Diving", "Gymnastics"
         season: "Summer" or "Winter"
+        db: database to query (default: the shared connection)
 
     Returns:
         dict with total medals, gold/silver/bronze breakdown, and top 5 events
     """
-    match_filter: Dict[str, Any] = {"noc": "CHN"}
-    if medal_type:
-        match_filter["medal"] = medal_type
-    if sport:
-        match_filter["sport"] = sport
-    if season:
-        match_filter["season"] = season
+    filters = {"medal_type": medal_type, "sport": sport, "season": season}
+    return get_china_medals_batch([filters], db=db)[0]
+
+
+def get_medals(
+    noc: str,
+    medal_type: Optional[str] = None,
+    sport: Optional[str] = None,
+    season: Optional[str] = None,
+    db: Optional[Database] = None
+) -> Dict[str, Any]:
+    """
+    Returns any NOC's medal counts, optionally filtered by medal type, sport, and/or season.
+
+    How it works:
+    - One get_medals_batch call: a single aggregation with a breakdown by medal type
+      (from the cube) and top events (from results, since the cube has no event)
+    - The total is read off the breakdown, so the whole summary is one round trip
+
+    Returns:
+        dict with total medals, gold/silver/bronze breakdown, and top 5 events
+    """
+    filters = {"noc": noc, "medal_type": medal_type, "sport": sport, "season": season}
+    return get_medals_batch([filters], db=db)[0]
 
-    # Total count with all filters applied
-    total = db.results.count_documents(match_filter)
 
-    # Breakdown by medal type (without medal_type filter so we always see all three)
-    breakdown_filter: Dict[str, Any] = {"noc": "CHN"}
+def _within(noc: str, sport: Optional[str] = None, season: Optional[str] = None) -> Dict[str, Any]:
+    # The noc / sport / season part of a filter (the breakdown ignores medal_type)
+    within: Dict[str, Any] = {"noc": noc}
     if sport:
-        breakdown_filter["sport"] = sport
+        within["sport"] = sport
     if season:
-        breakdown_filter["season"] = season
+        within["season"] = season
+    return within
 
-    breakdown = list(db.results.aggregate([
-        {"$match": breakdown_filter},
-        {"$group": {"_id": "$medal", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ]))
-
-    # Top 5 events by medal count
-    top_events = list(db.results.aggregate([
-        {"$match": match_filter},
-        {"$group": {"_id": "$event", "medals": {"$sum": 1}}},
-        {"$sort": {"medals": -1}},
-        {"$limit": 5}
-    ]))
 
+def _medal_facets(key: str, medal_type: Optional[str], within: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The two $facet branches behind one get_medals summary. $facet cannot be nested,
+    so each filter combination gets its own pair of branches.
+    """
+    medal = [{"$match": {"medal": medal_type}}] if medal_type else []
     return {
-        "filters": {"medal_type": medal_type, "sport": sport, "season": season},
-        "total_medals": total,
-        "breakdown": {item["_id"]: item["count"] for item in breakdown},
-        "top_events": [{"event": e["_id"], "medals": e["medals"]} for e in top_events]
+        # Breakdown by medal type (without medal_type filter so we always see all three)
+        f"{key}_breakdown": [
+            {"$match": dict(within, source="cells")},
+            {"$group": {"_id": "$medal", "count": {"$sum": WEIGHT}}},
+            {"$sort": {"count": -1}}
+        ],
+        # Top 5 events by medal count
+        f"{key}_top_events": [{"$match": dict(within, source="results")}] + medal + [
+            {"$group": {"_id": "$event", "medals": {"$sum": 1}}},
+            {"$sort": {"medals": -1}},
+            {"$limit": 5}
+        ],
     }
 
 
-def get_china_top_sports(top_n: int = 10) -> List[Dict[str, Any]]:
+def get_china_medals_batch(
+    filters: List[Dict[str, Optional[str]]],
+    db: Optional[Database] = None
+) -> List[Dict[str, Any]]:
     """
-    Returns China's most successful sports ranked by total medal count.
+    Returns get_china_medals for many filter combinations from one aggregation
+    (see get_medals_batch)
+    """
+    summaries = get_medals_batch([dict(f, noc="CHN") for f in filters], db=db)
+    # China's summaries keep their original filters shape, without the noc
+    for summary in summaries:
+        summary["filters"].pop("noc")
+    return summaries
+
+
+def get_medals_batch(
+    filters: List[Dict[str, Optional[str]]],
+    db: Optional[Database] = None
+) -> List[Dict[str, Any]]:
+    """
+    Returns get_medals for many filter combinations from one aggregation.
 
     How it works:
-    - Filters results to CHN
-    - Groups by sport, counting total medals and using $cond to count each medal type
-    - Sorts by total descending and limits to top_n
+    - One $match on the union of every combination's noc / sport / season, over the
+      medal cube, tagged as "cells"
+    - $unionWith brings in the matching raw results (the cube has no event dimension),
+      tagged as "results", for the top events
+    - Two $facet branches per combination (breakdown from cells, top events from results)
+    - Each combination's total is read off its breakdown
+
+    Parameters:
+        filters: dicts with a "noc" key (default "CHN") and optional "medal_type",
+            "sport" and "season" keys, e.g. [{"noc": n, "sport": "Diving"} for n in nocs]
+        db: database to query (default: the shared connection)
+
+    Returns:
+        list of get_medals summaries, in the same order as filters
+    """
+    if not filters:
+        return []
+    combos = [(f.get("noc") or "CHN", f.get("medal_type"), f.get("sport"), f.get("season")) for f in filters]
+    withins = [_within(noc, sport, season) for noc, _, sport, season in combos]
+    match_filter = withins[0] if len(withins) == 1 else {"$or": withins}
+
+    facets: Dict[str, Any] = {}
+    for i, ((_, medal_type, _, _), within) in enumerate(zip(combos, withins)):
+        facets.update(_medal_facets(f"f{i}", medal_type, within))
+
+    source = medal_collection(db)
+    pipeline = [
+        {"$match": match_filter},
+        {"$project": {"_id": 0, "noc": 1, "sport": 1, "season": 1, "medal": 1, "count": 1,
+                      "source": {"$literal": "cells"}}},
+        {"$unionWith": {"coll": "results", "pipeline": [
+            {"$match": match_filter},
+            {"$project": {"_id": 0, "noc": 1, "sport": 1, "season": 1, "medal": 1, "event": 1,
+                          "source": {"$literal": "results"}}},
+        ]}},
+        {"$facet": facets},
+    ]
+    doc = next(source.aggregate(pipeline))
+
+    summaries = []
+    for i, (noc, medal_type, sport, season) in enumerate(combos):
+        breakdown = {item["_id"]: item["count"] for item in doc[f"f{i}_breakdown"]}
+        summaries.append({
+            "filters": {"noc": noc, "medal_type": medal_type, "sport": sport, "season": season},
+            # Every result is a medal, so the breakdown already holds the total
+            "total_medals": breakdown.get(medal_type, 0) if medal_type else sum(breakdown.values()),
+            "breakdown": breakdown,
+            "top_events": [{"event": e["_id"], "medals": e["medals"]} for e in doc[f"f{i}_top_events"]]
+        })
+    return summaries
+
+
+def get_china_top_sports(top_n: int = 10, db: Optional[Database] = None) -> List[Dict[str, Any]]:
+    """
+    Returns China's most successful sports ranked by total medal count.
 
     Parameters:
         top_n: number of sports to return (default 10)
+        db: database to query (default: the shared connection)
 
     Returns:
         list of dicts with sport name, total, gold, silver, and bronze counts
     """
-    pipeline = [
-        {"$match": {"noc": "CHN"}},
+    return get_top_sports("CHN", top_n, db=db)
 
-        # Count total and each medal type using conditional sums
-        {"$group": {
-            "_id": "$sport",
-            "total": {"$sum": 1},
-            "gold": {"$sum": {"$cond": [{"$eq": ["$medal", "Gold"]}, 1, 0]}},
-            "silver": {"$sum": {"$cond": [{"$eq": ["$medal", "Silver"]}, 1, 0]}},
-            "bronze": {"$sum": {"$cond": [{"$eq": ["$medal", "Bronze"]}, 1, 0]}}
-        }},
+
+def get_top_sports(noc: str, top_n: int = 10, db: Optional[Database] = None) -> List[Dict[str, Any]]:
+    """
+    Returns any NOC's most successful sports ranked by total medal count.
+
+    How it works:
+    - Filters the cube to the NOC
+    - Groups by sport, summing total medals and using $cond to sum each medal type
+    - Sorts by total descending and limits to top_n
+
+    Returns:
+        list of dicts with sport name, total, gold, silver, and bronze counts
+    """
+    pipeline = [
+        {"$match": {"noc": noc}},
+        {"$group": medal_counts("$sport")},
 
         # Most medals first
         {"$sort": {"total": -1}},
         {"$limit": top_n}
     ]
-    return list(db.results.aggregate(pipeline))
+    return list(medal_collection(db).aggregate(pipeline))
 
 
 def get_china_medal_trends(
     start_year: Optional[int] = None,
-    end_year: Optional[int] = None
+    end_year: Optional[int] = None,
+    db: Optional[Database] = None
 ) -> List[Dict[str, Any]]:
     """
     Returns China's medal count per Olympic year, optionally within a year range.
 
-    How it works:
-    - Filters results to CHN with optional year range
-    - Groups by year and season, summing medals
-    - Projects clean output and sorts chronologically
-
     Parameters:
         start_year: earliest year to include
         end_year: latest year to include
+        db: database to query (default: the shared connection)
 
     Returns:
         list of dicts with year, season, and medal count
     """
-    match_filter: Dict[str, Any] = {"noc": "CHN"}
+    return get_medal_trends("CHN", start_year, end_year, db=db)
+
+
+def get_medal_trends(
+    noc: str,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    db: Optional[Database] = None
+) -> List[Dict[str, Any]]:
+    """
+    Returns any NOC's medal count per Olympic year, optionally within a year range.
+
+    How it works:
+    - Filters the cube to the NOC with optional year range
+    - Groups by year and season, summing medals
+    - Projects clean output and sorts chronologically
+
+    Returns:
+        list of dicts with year, season, and medal count
+    """
+    match_filter: Dict[str, Any] = {"noc": noc}
     if start_year or end_year:
         match_filter["year"] = {}
         if start_year:
@@ -145,7 +326,7 @@ def get_china_medal_trends(
         # Group by year and season to separate Summer/Winter
         {"$group": {
             "_id": {"year": "$year", "season": "$season"},
-            "medals": {"$sum": 1}
+            "medals": {"$sum": WEIGHT}
         }},
 
         # Flatten the _id fields into top-level keys
@@ -159,43 +340,148 @@ def get_china_medal_trends(
         # Chronological order
         {"$sort": {"year": 1}}
     ]
-    return list(db.results.aggregate(pipeline))
+    return list(medal_collection(db).aggregate(pipeline))
 
 
-def compare_china_vs(noc_list: List[str]) -> List[Dict[str, Any]]:
+def compare_china_vs(noc_list: List[str], db: Optional[Database] = None) -> List[Dict[str, Any]]:
     """
     Compares China's medal performance against other countries.
 
+    Parameters:
+        noc_list: list of NOC codes to compare against (e.g., ["USA", "GBR", "JPN"])
+        db: database to query (default: the shared connection)
+
+    Returns:
+        list of dicts with country, total, gold, silver, and bronze counts
+    """
+    return compare_nocs(["CHN"] + noc_list, db=db)
+
+
+def compare_nocs(noc_list: List[str], db: Optional[Database] = None) -> List[Dict[str, Any]]:
+    """
+    Compares the medal performance of any countries.
+
     How it works:
-    - Combines CHN with the provided list of NOCs
-    - Uses $in to match all relevant countries in one query
+    - Uses $in to match all the countries' cube cells in one query
     - Groups by NOC with conditional sums for each medal type
     - Sorts by total medals descending
 
-    Parameters:
-        noc_list: list of NOC codes to compare against (e.g., ["USA", "GBR", "JPN"])
-
     Returns:
         list of dicts with country, total, gold, silver, and bronze counts
     """
-    all_nocs = ["CHN"] + [n.upper() for n in noc_list]
+    all_nocs = list(dict.fromkeys(n.upper() for n in noc_list))
     pipeline = [
-        # Match China and all comparison countries
+        # Match all the countries being compared
         {"$match": {"noc": {"$in": all_nocs}}},
-
-        # Count total and each medal type per country
-        {"$group": {
-            "_id": "$noc",
-            "total": {"$sum": 1},
-            "gold": {"$sum": {"$cond": [{"$eq": ["$medal", "Gold"]}, 1, 0]}},
-            "silver": {"$sum": {"$cond": [{"$eq": ["$medal", "Silver"]}, 1, 0]}},
-            "bronze": {"$sum": {"$cond": [{"$eq": ["$medal", "Bronze"]}, 1, 0]}}
-        }},
+        {"$group": medal_counts("$noc")},
 
         # Most medals first
         {"$sort": {"total": -1}}
     ]
-    return list(db.results.aggregate(pipeline))
+    return list(medal_collection(db).aggregate(pipeline))
+
+
+def medal_leaderboard(
+    top_n: int = 10,
+    season: Optional[str] = None,
+    year: Optional[int] = None,
+    sport: Optional[str] = None,
+    db: Optional[Database] = None
+) -> List[Dict[str, Any]]:
+    """
+    Returns the countries with the most medals, optionally for one season, year and/or sport.
+
+    How it works:
+    - Filters cube cells, groups by NOC with conditional sums for each medal type
+    - Sorts by total (then gold) descending and limits to top_n
+
+    Returns:
+        list of dicts with country, total, gold, silver, and bronze counts
+    """
+    match_filter: Dict[str, Any] = {}
+    if season:
+        match_filter["season"] = season
+    if year:
+        match_filter["year"] = year
+    if sport:
+        match_filter["sport"] = sport
+
+    pipeline = [
+        {"$match": match_filter},
+        {"$group": medal_counts("$noc")},
+        {"$sort": {"total": -1, "gold": -1}},
+        {"$limit": top_n}
+    ]
+    return list(medal_collection(db).aggregate(pipeline))
+
+
+def get_sport_medal_matrix(
+    noc: str = "CHN",
+    season: Optional[str] = "Summer",
+    top_n: int = 6,
+    db: Optional[Database] = None
+) -> Dict[str, Any]:
+    """
+    Returns a dense year × sport medal matrix for a NOC's top_n sports, in one aggregation.
+
+    How it works:
+    - Filters the cube to the NOC (and season, if given)
+    - $facet: ranks sports by total medals, and sums medals per (year, sport)
+    - Keeps the cells of the top sports, collects the years any of them won a medal,
+      and maps every top sport over those years, filling 0 where it won nothing
+
+    Parameters:
+        noc: NOC code
+        season: "Summer", "Winter", or None for both
+        top_n: number of sports (rows of the matrix)
+        db: database to query (default: the shared connection)
+
+    Returns:
+        dict with "years" (ascending) and "sports": [{"sport", "medals": [one count per year]}],
+        most successful sport first
+    """
+    match_filter: Dict[str, Any] = {"noc": noc}
+    if season:
+        match_filter["season"] = season
+
+    pipeline = [
+        {"$match": match_filter},
+        {"$facet": {
+            "top": [
+                {"$group": {"_id": "$sport", "total": {"$sum": WEIGHT}}},
+                {"$sort": {"total": -1, "_id": 1}},
+                {"$limit": top_n}
+            ],
+            "cells": [
+                {"$group": {"_id": {"year": "$year", "sport": "$sport"}, "medals": {"$sum": WEIGHT}}}
+            ],
+        }},
+        # Only the top sports' cells, and the years in which any of them won medals
+        {"$set": {
+            "top": "$top._id",
+            "cells": {"$filter": {"input": "$cells", "cond": {"$in": ["$$this._id.sport", "$top._id"]}}},
+        }},
+        {"$set": {"years": {"$sortArray": {"input": {"$setUnion": ["$cells._id.year"]}, "sortBy": 1}}}},
+        # One row per sport, one column per year, zero where there is no cell
+        {"$project": {
+            "_id": 0,
+            "years": 1,
+            "sports": {"$map": {"input": "$top", "as": "sport", "in": {
+                "sport": "$$sport",
+                "medals": {"$map": {"input": "$years", "as": "year", "in": {"$ifNull": [
+                    {"$first": {"$map": {
+                        "input": {"$filter": {"input": "$cells", "as": "cell", "cond": {"$and": [
+                            {"$eq": ["$$cell._id.sport", "$$sport"]},
+                            {"$eq": ["$$cell._id.year", "$$year"]},
+                        ]}}},
+                        "in": "$$this.medals",
+                    }}},
+                    0,
+                ]}}},
+            }}},
+        }},
+    ]
+    return next(medal_collection(db).aggregate(pipeline), {"years": [], "sports": []})
 
 
 # === Test the API ===
@@ -0,0 +1,93 @@
+"""
+Olympics Analysis Using MongoDB
+
+Shared MongoDB connection for every API module.
+    Each MongoClient owns a connection pool and background monitor threads, so the APIs
+    take a client instead of opening their own. get_client() returns one cached client
+    per set of options; it does not connect until the first query.
+
+    Settings (arguments override environment variables, which override the defaults):
+        MONGODB_URI               mongodb://localhost:27017/
+        MONGODB_DB                olympics
+        MONGODB_MAX_POOL_SIZE     connections per server (default 10)
+        MONGODB_TIMEOUT_MS        server selection / connect timeout (default 5000)
+        MONGODB_READ_PREFERENCE   primary, primaryPreferred, secondary, secondaryPreferred, nearest
+"""
+from typing import Dict, Any, Optional
+import os
+import threading
+
+from pymongo import MongoClient, AsyncMongoClient
+
+DEFAULT_URI = "mongodb://localhost:27017/"
+DEFAULT_DB = "olympics"
+DEFAULT_MAX_POOL_SIZE = 10
+DEFAULT_TIMEOUT_MS = 5000
+DEFAULT_READ_PREFERENCE = "primary"
+
+_clients: Dict[tuple, MongoClient] = {}
+_lock = threading.Lock()
+
+
+def client_settings(
+        uri: Optional[str] = None,
+        max_pool_size: Optional[int] = None,
+        timeout_ms: Optional[int] = None,
+        read_preference: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Resolves the connection settings from arguments, then environment, then defaults
+    """
+    env = os.environ
+    timeout = int(timeout_ms or env.get("MONGODB_TIMEOUT_MS", DEFAULT_TIMEOUT_MS))
+    return {
+        "host": uri or env.get("MONGODB_URI", DEFAULT_URI),
+        "maxPoolSize": int(max_pool_size or env.get("MONGODB_MAX_POOL_SIZE", DEFAULT_MAX_POOL_SIZE)),
+        "serverSelectionTimeoutMS": timeout,
+        "connectTimeoutMS": timeout,
+        "readPreference": read_preference or env.get("MONGODB_READ_PREFERENCE", DEFAULT_READ_PREFERENCE),
+    }
+
+
+def get_client(**settings) -> MongoClient:
+    """
+    Returns the process-wide client for these settings (see client_settings), creating
+    it on first use. connect=False defers the first connection to the first query.
+    """
+    options = client_settings(**settings)
+    key = tuple(sorted(options.items()))
+    with _lock:
+        if key not in _clients:
+            _clients[key] = MongoClient(connect=False, **options)
+        return _clients[key]
+
+
+def get_db(db_name: Optional[str] = None, client: Optional[MongoClient] = None):
+    """
+    Returns a database on the shared client (or on `client` if given)
+    """
+    client = client if client is not None else get_client()
+    return client[db_name or os.environ.get("MONGODB_DB", DEFAULT_DB)]
+
+
+def get_async_client(**settings) -> AsyncMongoClient:
+    """
+    An asyncio client with the same settings. Not cached: an async client belongs to the
+    event loop it is first used on, so each loop should create (and close) its own.
+    """
+    return AsyncMongoClient(connect=False, **client_settings(**settings))
+
+
+def clear_collection(db, name: str) -> None:
+    """
+    Empties a derived collection (rollup, sketches, incidence index, medal cube) before
+    a full rebuild. delete_many rather than drop, so the collection keeps its indexes.
+    """
+    db[name].delete_many({})
+
+
+def close_clients() -> None:
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,103 @@
+"""
+Content-hash build cache for the conversion step.
+
+A manifest (build_manifest.json) records, for every output the converter has
+written, a fingerprint of the inputs each collection was built from and a hash of
+the file it was written to. On the next run only collections whose inputs (or
+output files) changed are rebuilt:
+    athletes, events, games, results  ← the athlete-event TSVs
+    countries                         ← the country information TSV
+Both fingerprints also cover the converter source and output options, so changing
+the code or the format invalidates the cache.
+"""
+import hashlib
+import json
+import os
+
+MANIFEST_FILE = "build_manifest.json"
+TSV_COLLECTIONS = ["athletes", "events", "games", "results"]
+COUNTRY_COLLECTIONS = ["countries"]
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's contents, or None if it does not exist
+    """
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def combined_hash(parts):
+    return hashlib.sha256("\n".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def input_fingerprints(inputs, country_file, salt=""):
+    """
+    Returns {collection: fingerprint of everything that collection is built from}
+    """
+    tsv = combined_hash([salt] + [f"{os.path.basename(p)}:{file_hash(p)}" for p in inputs])
+    countries = combined_hash([salt, file_hash(country_file)])
+    fingerprints = {name: tsv for name in TSV_COLLECTIONS}
+    fingerprints.update({name: countries for name in COUNTRY_COLLECTIONS})
+    return fingerprints
+
+
+def load_manifest(path=MANIFEST_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    # Write then rename, so an interrupted run never leaves a half-written manifest
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def stale_collections(entry, fingerprints, output_paths):
+    """
+    Returns the collections that must be rebuilt: their input fingerprint changed, or
+    their output file is missing or no longer matches what was written.
+
+    Parameters:
+        entry: the manifest entry for this output ({"collections": {name: {...}}})
+        fingerprints: current input fingerprints from input_fingerprints()
+        output_paths: {collection: file the collection is written to}
+    """
+    recorded = (entry or {}).get("collections", {})
+    hashes = {}
+    stale = set()
+    for name, fingerprint in fingerprints.items():
+        path = output_paths[name]
+        if path not in hashes:
+            hashes[path] = file_hash(path)
+        previous = recorded.get(name, {})
+        if previous.get("input") != fingerprint or hashes[path] is None \
+                or previous.get("output") != hashes[path]:
+            stale.add(name)
+    return stale
+
+
+def record_outputs(entry, fingerprints, output_paths, collections):
+    """
+    Updates a manifest entry after `collections` were (re)written and returns it
+    """
+    entry = dict(entry or {})
+    recorded = dict(entry.get("collections", {}))
+    hashes = {}
+    for name in collections:
+        path = output_paths[name]
+        if path not in hashes:
+            hashes[path] = file_hash(path)
+        recorded[name] = {"input": fingerprints[name], "output": hashes[path]}
+    entry["collections"] = recorded
+    return entry
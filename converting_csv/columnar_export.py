@@ -0,0 +1,140 @@
+"""
+Columnar (Parquet / Arrow IPC) export of the converted Olympics data.
+
+Writes two tables straight from a CollectionBuilder, before it is turned into
+MongoDB documents:
+    results        one row per (deduplicated) medal result
+    participation  one row per athlete × Games × event
+
+String columns are dictionary-encoded, so they can be scanned with vectorized
+tools (pyarrow, pandas, DuckDB, Polars) for offline reports without loading MongoDB.
+pyarrow is only needed for this export.
+"""
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed for the columnar export
+    pa = feather = pq = None
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The columnar export needs pyarrow: pip install pyarrow")
+
+
+def dictionary_column(codes, table):
+    """
+    Builds a dictionary-encoded Arrow column from StringTable codes, keeping only the
+    strings this column actually uses
+    """
+    used = sorted({c for c in codes if c is not None})
+    position = {code: i for i, code in enumerate(used)}
+    indices = pa.array([position.get(c) for c in codes], type=pa.int32())
+    dictionary = pa.array([table.strings[c] for c in used], type=pa.string())
+    return pa.DictionaryArray.from_arrays(indices, dictionary)
+
+
+def string_column(values):
+    return pa.array(values, type=pa.string()).dictionary_encode()
+
+
+def results_table(builder):
+    """
+    One row per medal result, in the same order the results collection is written
+    """
+    results = sorted(
+        builder.results,
+        key=lambda r: (r.year or 0, builder.table.decode(r.games) or "", builder.table.decode(r.event) or ""),
+    )
+    table = builder.table
+    return pa.table({
+        "athlete_id": pa.array([r.athlete_id for r in results], type=pa.string()),
+        "athlete_name": pa.array([r.athlete_name for r in results], type=pa.string()),
+        "sex": string_column([r.sex for r in results]),
+        "noc": dictionary_column([r.noc for r in results], table),
+        "games": dictionary_column([r.games for r in results], table),
+        "year": pa.array([r.year for r in results], type=pa.int16()),
+        "season": dictionary_column([r.season for r in results], table),
+        "sport": dictionary_column([r.sport for r in results], table),
+        "event": dictionary_column([r.event for r in results], table),
+        "medal": dictionary_column([r.medal for r in results], table),
+    })
+
+
+def participation_table(builder):
+    """
+    One row per athlete × Games × event, taken from each Games' athlete-event linkage
+    """
+    columns = {name: [] for name in ("athlete_id", "sex", "games", "year", "season", "event", "sport")}
+    games = sorted(builder.games.values(), key=lambda g: g.first)
+    games.sort(key=lambda g: (g.year or 0, builder.table.decode(g.season) or ""))
+
+    for gd in games:
+        for aid, ga in sorted(gd.athletes.items()):
+            athlete = builder.athletes.get(aid)
+            for event in ga.events:
+                columns["athlete_id"].append(aid)
+                columns["sex"].append(athlete.sex if athlete else None)
+                columns["games"].append(gd.games)
+                columns["year"].append(gd.year)
+                columns["season"].append(gd.season)
+                columns["event"].append(event)
+                columns["sport"].append(builder.events[event].sport)
+
+    table = builder.table
+    return pa.table({
+        "athlete_id": pa.array(columns["athlete_id"], type=pa.string()),
+        "sex": string_column(columns["sex"]),
+        "games": dictionary_column(columns["games"], table),
+        "year": pa.array(columns["year"], type=pa.int16()),
+        "season": dictionary_column(columns["season"], table),
+        "event": dictionary_column(columns["event"], table),
+        "sport": dictionary_column(columns["sport"], table),
+    })
+
+
+def write_columnar(builder, directory, fmt="parquet"):
+    """
+    Writes results and participation tables into `directory`. Must be called before
+    the builder is consumed by CollectionBuilder.collections().
+
+    Returns {table name: row count}.
+    """
+    _require_pyarrow()
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for name, table in (("results", results_table(builder)),
+                        ("participation", participation_table(builder))):
+        path = os.path.join(directory, name + FORMATS[fmt])
+        if fmt == "parquet":
+            pq.write_table(table, path, compression="zstd")
+        else:
+            feather.write_feather(table, path, compression="zstd")
+        counts[name] = table.num_rows
+    return counts
+
+
+def read_table(directory, name, fmt="parquet", columns=None):
+    """
+    Reads one exported table back, optionally only the given columns
+    """
+    _require_pyarrow()
+    path = os.path.join(directory, name + FORMATS[fmt])
+    if fmt == "parquet":
+        return pq.read_table(path, columns=columns)
+    return feather.read_table(path, columns=columns)
+
+
+def medal_tally(results, by=("noc",)):
+    """
+    Vectorized medal counts per group from an exported results table, most medals first.
+    Example: medal_tally(read_table("olympics_columnar", "results"), by=("noc", "medal"))
+    """
+    _require_pyarrow()
+    tally = results.group_by(list(by)).aggregate([("medal", "count")])
+    return tally.sort_by([("medal_count", "descending")])
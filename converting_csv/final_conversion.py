@@ -1,15 +1,32 @@
+import argparse
 import csv
+import gzip
+import io
 import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 # ── CONFIG ────────────────────────────────────────────────────────────────
 FILES = ["olympics.tsv", "olympics_2022.tsv"]
 COUNTRY_FILE = "country-information.tsv"
 OUTPUT_FILE = "olympics.json"
+NDJSON_DIR = "olympics_ndjson"
+COLLECTIONS = ["athletes", "countries", "events", "games", "results"]
 
 # ── UTILITY FUNCTIONS ─────────────────────────────────────────────────────
-def read_tsv(filepath):
+def iter_tsv(filepath):
+    """
+    Yields one row dict at a time so a file is never held in memory as a whole
+    """
     with open(filepath, encoding="utf-8") as f:
-        return list(csv.DictReader(f, delimiter="\t"))
+        yield from csv.DictReader(f, delimiter="\t")
+
+def iter_rows(files):
+    for f in files:
+        yield from iter_tsv(f)
 
 def clean(val):
     if val is None:
@@ -31,182 +48,649 @@ def to_float(val):
     except ValueError:
         return None
 
-# ── LOAD DATA ─────────────────────────────────────────────────────────────
-rows = []
-for f in FILES:
-    rows.extend(read_tsv(f))
-country_rows = read_tsv(COUNTRY_FILE)
-
-# ── 1. ATHLETES COLLECTION ─────────────────────────────────────────────────
-athletes = {}
-for r in rows:
-    aid = r["athlete_id"].strip()
-    if aid not in athletes:
-        athletes[aid] = {
-            "athlete_id": aid,
-            "name": clean(r["name"]),
-            "sex": clean(r["sex"]),
-            "birth_year": to_int(r["birth_year"]),
-            "birth_day": clean(r["birth_day"]),
-            "birth_place": clean(r["birth_place"]),
-            "height_cm": to_float(r["height"]),
-            "weight_kg": to_float(r["weight"]),
-            "nocs": set(),
-            "teams": set(),
-            "events": set(),
-        }
-    athletes[aid]["nocs"].add(r["noc"].strip())
-    if clean(r["team"]):
-        athletes[aid]["teams"].add(clean(r["team"]))
-    if clean(r["event"]):
-        athletes[aid]["events"].add(clean(r["event"]))
-
-athlete_collection = []
-for a in athletes.values():
-    a["nocs"] = sorted(a["nocs"])
-    a["teams"] = sorted(a["teams"])
-    a["events"] = sorted(a["events"])
-    athlete_collection.append(a)
-athlete_collection.sort(key=lambda x: x["athlete_id"])
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (None where unsupported)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
 
-# ── 2. COUNTRIES COLLECTION ────────────────────────────────────────────────
-country_collection = []
-for r in country_rows:
-    noc = clean(r.get("NOC"))
-    if not noc:
-        continue
-    country_collection.append({
-        "noc": noc,
-        "official_name": clean(r.get("official_name_en")),
-        "continent": clean(r.get("Continent")),
-        "capital": clean(r.get("Capital")),
-    })
-
-# ── 3. EVENTS COLLECTION ───────────────────────────────────────────────────
-events = {}
-for r in rows:
-    event = clean(r["event"])
-    sport = clean(r["sport"])
-    if not event:
-        continue
-    if event not in events:
-        events[event] = {
-            "event_name": event,
-            "sport": sport,
-            "games_held_in": set(),
-        }
-    events[event]["games_held_in"].add(clean(r["games"]))
-
-event_collection = []
-for e in events.values():
-    e["games_held_in"] = sorted(e["games_held_in"])
-    event_collection.append(e)
-event_collection.sort(key=lambda x: x["event_name"])
-
-# ── 4. GAMES COLLECTION ────────────────────────────────────────────────────
-games = {}
-for r in rows:
-    g = clean(r["games"])
-    if not g:
-        continue
-    if g not in games:
-        games[g] = {
-            "games": g,
-            "year": to_int(r["year"]),
-            "season": clean(r["season"]),
-            "city": clean(r["city"]),
-            "events": set(),
-            "athletes": {},          # { athlete_id -> {name, events: set()} }
-            "medal_results": [],
-            "_medal_set": set(),
-        }
-    gd = games[g]
-    event = clean(r["event"])
-    aid = r["athlete_id"].strip()
-    medal = clean(r["medal"])
-
-    if event:
-        gd["events"].add(event)
-
-    # ── athlete-event linkage ──────────────────────────────────────────
-    if aid not in gd["athletes"]:
-        gd["athletes"][aid] = {"name": clean(r["name"]), "events": set()}
-    if event:
-        gd["athletes"][aid]["events"].add(event)
-
-    if medal:
-        key = (aid, event, medal)
-        if key not in gd["_medal_set"]:
-            gd["_medal_set"].add(key)
-            gd["medal_results"].append({
-                "athlete_id": aid,
-                "athlete_name": clean(r["name"]),
-                "event": event,
-                "medal": medal,
+# ── COMPACT IN-MEMORY RECORDS ─────────────────────────────────────────────
+class StringTable:
+    """
+    Dictionary encoding for the categorical columns (noc, sport, event, games,
+    season, city, team, medal). Each distinct string is stored once and rows refer
+    to it by an integer code; strings are only decoded again when writing output.
+    """
+    __slots__ = ("codes", "strings")
+
+    def __init__(self):
+        self.codes = {}
+        self.strings = []
+
+    def encode(self, value):
+        if value is None:
+            return None
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def decode(self, code):
+        return None if code is None else self.strings[code]
+
+    def decode_sorted(self, codes):
+        return sorted(self.decode(c) for c in codes)
+
+    def remap_from(self, other):
+        """
+        Returns a function translating `other`'s codes into codes of this table
+        """
+        mapping = [self.encode(s) for s in other.strings]
+        return lambda code: None if code is None else mapping[code]
+
+
+class Record:
+    """
+    Base of the __slots__ records. They pickle as (class, field values) rather than
+    through the default slot-state dicts, which halves the cost of shipping a shard's
+    builder back from a worker process.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        return _make_record, (type(self), tuple(getattr(self, f) for f in self.__slots__))
+
+
+def _make_record(cls, values):
+    record = cls.__new__(cls)
+    for field, value in zip(cls.__slots__, values):
+        setattr(record, field, value)
+    return record
+
+
+class AthleteRecord(Record):
+    __slots__ = ("athlete_id", "name", "sex", "birth_year", "birth_day", "birth_place",
+                 "height_cm", "weight_kg", "nocs", "teams", "events", "first")
+
+
+class EventRecord(Record):
+    __slots__ = ("sport", "games_held_in", "first")
+
+
+class GamesRecord(Record):
+    __slots__ = ("games", "year", "season", "city", "events", "athletes",
+                 "medal_results", "medal_set", "first")
+
+
+class GamesAthleteRecord(Record):
+    __slots__ = ("name", "events")
+
+
+class ResultRecord(Record):
+    __slots__ = ("athlete_id", "athlete_name", "sex", "noc", "games", "year",
+                 "season", "sport", "event", "medal")
+
+
+# ── SINGLE-PASS BUILDER ───────────────────────────────────────────────────
+class CollectionBuilder:
+    """
+    Accumulates the athletes, events, games and results collections from a
+    stream of TSV rows. Every row is looked at exactly once, so the input never
+    has to be materialized as a list.
+
+    Categorical values are held as StringTable codes inside __slots__ records, and
+    athlete ids and names are interned, so a value repeated on millions of rows is
+    stored once. Documents are decoded back to strings only when collections are built.
+
+    Athletes, events and games remember the index of the row that created them
+    ("first") so builders fed disjoint shards of the input can be merged back into
+    exactly what a single builder would have produced.
+    """
+
+    def __init__(self):
+        self.table = StringTable()
+        self.athletes = {}
+        self.events = {}
+        self.games = {}
+        self.results = []
+        self._result_set = set()
+        self.rows = 0
+
+    def add(self, r, index=None):
+        """
+        Adds one row. `index` is the row's position in the full input; it defaults to
+        the number of rows this builder has seen, which is the same thing when unsharded.
+        """
+        if index is None:
+            index = self.rows
+        self.rows += 1
+        encode = self.table.encode
+        aid = sys.intern(r["athlete_id"].strip())
+        event = encode(clean(r["event"]))
+        games = encode(clean(r["games"]))
+        medal = encode(clean(r["medal"]))
+        self._add_athlete(r, aid, event, index)
+        self._add_event(r, event, games, index)
+        self._add_games(r, aid, event, games, medal, index)
+        if medal is not None:
+            self._add_result(r, aid, event, games, medal)
+
+    def add_all(self, rows):
+        for r in rows:
+            self.add(r)
+        return self
+
+    # ── 1. ATHLETES ───────────────────────────────────────────────────────
+    def _add_athlete(self, r, aid, event, index):
+        a = self.athletes.get(aid)
+        if a is None:
+            a = self.athletes[aid] = AthleteRecord()
+            a.athlete_id = aid
+            a.name = _intern(clean(r["name"]))
+            a.sex = _intern(clean(r["sex"]))
+            a.birth_year = to_int(r["birth_year"])
+            a.birth_day = clean(r["birth_day"])
+            a.birth_place = clean(r["birth_place"])
+            a.height_cm = to_float(r["height"])
+            a.weight_kg = to_float(r["weight"])
+            a.nocs = set()
+            a.teams = set()
+            a.events = set()
+            a.first = index
+        a.nocs.add(self.table.encode(r["noc"].strip()))
+        team = clean(r["team"])
+        if team:
+            a.teams.add(self.table.encode(team))
+        if event is not None:
+            a.events.add(event)
+
+    # ── 3. EVENTS ─────────────────────────────────────────────────────────
+    def _add_event(self, r, event, games, index):
+        if event is None:
+            return
+        e = self.events.get(event)
+        if e is None:
+            e = self.events[event] = EventRecord()
+            e.sport = self.table.encode(clean(r["sport"]))
+            e.games_held_in = set()
+            e.first = index
+        e.games_held_in.add(games)
+
+    # ── 4. GAMES ──────────────────────────────────────────────────────────
+    def _add_games(self, r, aid, event, games, medal, index):
+        if games is None:
+            return
+        gd = self.games.get(games)
+        if gd is None:
+            gd = self.games[games] = GamesRecord()
+            gd.games = games
+            gd.year = to_int(r["year"])
+            gd.season = self.table.encode(clean(r["season"]))
+            gd.city = self.table.encode(clean(r["city"]))
+            gd.events = set()
+            gd.athletes = {}          # { athlete_id -> GamesAthleteRecord(name, events) }
+            gd.medal_results = []     # [(athlete_id, athlete_name, event, medal)]
+            gd.medal_set = set()
+            gd.first = index
+
+        if event is not None:
+            gd.events.add(event)
+
+        # ── athlete-event linkage ──────────────────────────────────────────
+        ga = gd.athletes.get(aid)
+        if ga is None:
+            ga = gd.athletes[aid] = GamesAthleteRecord()
+            ga.name = _intern(clean(r["name"]))
+            ga.events = set()
+        if event is not None:
+            ga.events.add(event)
+
+        if medal is not None:
+            key = (aid, event, medal)
+            if key not in gd.medal_set:
+                gd.medal_set.add(key)
+                gd.medal_results.append((aid, _intern(clean(r["name"])), event, medal))
+
+    # ── 5. RESULTS ────────────────────────────────────────────────────────
+    def _add_result(self, r, aid, event, games, medal):
+        key = (aid, event, games, medal)
+        if key in self._result_set:
+            return
+        self._result_set.add(key)
+
+        encode = self.table.encode
+        res = ResultRecord()
+        res.athlete_id = aid
+        res.athlete_name = _intern(clean(r["name"]))
+        res.sex = _intern(clean(r["sex"]))
+        res.noc = encode(clean(r["noc"]))
+        res.games = games
+        res.year = to_int(r["year"])
+        res.season = encode(clean(r["season"]))
+        res.sport = encode(clean(r["sport"]))
+        res.event = event
+        res.medal = medal
+        self.results.append(res)
+
+    # ── MERGE ─────────────────────────────────────────────────────────────
+    def merge(self, other):
+        """
+        Folds in a builder that saw a different shard of the same input. The record
+        created by the earliest row wins (as in a serial pass) and the sets are unioned.
+        Shards are split by Games, so games and results never overlap between builders.
+        """
+        code = self.table.remap_from(other.table)
+
+        for aid, a in other.athletes.items():
+            a.nocs = {code(c) for c in a.nocs}
+            a.teams = {code(c) for c in a.teams}
+            a.events = {code(c) for c in a.events}
+            self.athletes[aid] = _merge_first(self.athletes.get(aid), a, ("nocs", "teams", "events"))
+
+        for event, e in other.events.items():
+            e.sport = code(e.sport)
+            e.games_held_in = {code(c) for c in e.games_held_in}
+            event = code(event)
+            self.events[event] = _merge_first(self.events.get(event), e, ("games_held_in",))
+
+        for gd in other.games.values():
+            gd.games, gd.season, gd.city = code(gd.games), code(gd.season), code(gd.city)
+            gd.events = {code(c) for c in gd.events}
+            for ga in gd.athletes.values():
+                ga.events = {code(c) for c in ga.events}
+            gd.medal_results = [(aid, name, code(ev), code(m)) for aid, name, ev, m in gd.medal_results]
+            gd.medal_set = {(aid, code(ev), code(m)) for aid, ev, m in gd.medal_set}
+            self.games[gd.games] = gd
+
+        for res in other.results:
+            res.noc, res.games, res.season = code(res.noc), code(res.games), code(res.season)
+            res.sport, res.event, res.medal = code(res.sport), code(res.event), code(res.medal)
+            self.results.append(res)
+            self._result_set.add((res.athlete_id, res.event, res.games, res.medal))
+
+        self.rows += other.rows
+        return self
+
+    # ── FINALIZE ──────────────────────────────────────────────────────────
+    def athlete_collection(self):
+        decode_sorted = self.table.decode_sorted
+        athlete_collection = [
+            {
+                "athlete_id": a.athlete_id,
+                "name": a.name,
+                "sex": a.sex,
+                "birth_year": a.birth_year,
+                "birth_day": a.birth_day,
+                "birth_place": a.birth_place,
+                "height_cm": a.height_cm,
+                "weight_kg": a.weight_kg,
+                "nocs": decode_sorted(a.nocs),
+                "teams": decode_sorted(a.teams),
+                "events": decode_sorted(a.events),
+                # Stored so top athletes by event count can be read from an index
+                "event_count": len(a.events),
+            }
+            for a in self.athletes.values()
+        ]
+        athlete_collection.sort(key=lambda x: x["athlete_id"])
+        return athlete_collection
+
+    def event_collection(self):
+        decode = self.table.decode
+        event_collection = [
+            {
+                "event_name": decode(event),
+                "sport": decode(e.sport),
+                "games_held_in": self.table.decode_sorted(e.games_held_in),
+            }
+            for event, e in self.events.items()
+        ]
+        event_collection.sort(key=lambda x: x["event_name"])
+        return event_collection
+
+    def games_collection(self):
+        decode, decode_sorted = self.table.decode, self.table.decode_sorted
+        games_collections = []
+        # Input order first, so Games that tie on (year, season) keep their serial order
+        for gd in sorted(self.games.values(), key=lambda x: x.first):
+            medal_results = [
+                {"athlete_id": aid, "athlete_name": name, "event": decode(event), "medal": decode(medal)}
+                for aid, name, event, medal in gd.medal_results
+            ]
+            medal_results.sort(key=lambda x: (x["event"] or "", x["medal"] or ""))
+            games_collections.append({
+                "games": decode(gd.games),
+                "year": gd.year,
+                "season": decode(gd.season),
+                "city": decode(gd.city),
+                "events": decode_sorted(gd.events),
+                # Serialize athletes dict → list with events as sorted list. Sex is copied
+                # onto each entry so queries can filter female athletes inside games directly
+                "athletes": [
+                    {"athlete_id": aid, "name": info.name, "sex": self.athletes[aid].sex,
+                     "events": decode_sorted(info.events)}
+                    for aid, info in sorted(gd.athletes.items())
+                ],
+                "medal_results": medal_results,
             })
+        games_collections.sort(key=lambda x: (x["year"] or 0, x["season"] or ""))
+        return games_collections
+
+    def results_collection(self):
+        decode = self.table.decode
+        results_collection = [
+            {
+                "athlete_id": res.athlete_id,
+                "athlete_name": res.athlete_name,
+                "sex": res.sex,
+                "noc": decode(res.noc),
+                "games": decode(res.games),
+                "year": res.year,
+                "season": decode(res.season),
+                "sport": decode(res.sport),
+                "event": decode(res.event),
+                "medal": decode(res.medal),
+            }
+            for res in self.results
+        ]
+        results_collection.sort(key=lambda x: (x["year"] or 0, x["games"] or "", x["event"] or ""))
+        return results_collection
+
+    def collections(self, country_rows):
+        """
+        Yields (name, documents) one collection at a time, dropping each accumulator
+        once it has been handed out so a streaming writer never holds them all at once.
+        The builder is consumed by this call.
+        """
+        yield "athletes", self.athlete_collection()
+        yield "countries", country_collection(country_rows)
+        yield "events", self.event_collection()
+        self.events = {}
+        # games entries copy each athlete's sex, so the athletes are released after games
+        yield "games", self.games_collection()
+        self.games, self.athletes = {}, {}
+        yield "results", self.results_collection()
+        self.results, self._result_set = [], set()
+
+    def build(self, country_rows):
+        """
+        Returns every collection keyed by name. The builder is consumed by this call.
+        """
+        return dict(self.collections(country_rows))
+
+
+def _intern(value):
+    return None if value is None else sys.intern(value)
+
+
+def _merge_first(mine, theirs, set_fields):
+    """
+    Keeps whichever record was created by the earlier row and unions the set fields into it
+    """
+    if mine is None:
+        return theirs
+    keep, extra = (mine, theirs) if mine.first <= theirs.first else (theirs, mine)
+    for field in set_fields:
+        getattr(keep, field).update(getattr(extra, field))
+    return keep
+
+
+# ── SHARDED (MULTI-PROCESS) BUILD ─────────────────────────────────────────
+SHARD_INDEX = "_row"
+
+def split_by_games(files, directory, shards):
+    """
+    Streams the input once into `shards` TSV files under `directory`, keeping each
+    Games in a single shard and each row's input position in an extra column. A Games
+    goes to whichever shard has the fewest rows when it first appears.
+    Returns the paths of the shards that received rows.
+    """
+    paths = [os.path.join(directory, f"shard_{i}.tsv") for i in range(shards)]
+    handles = [open(path, "w", encoding="utf-8", newline="") for path in paths]
+    sizes = [0] * shards
+    try:
+        writers = [csv.writer(h, delimiter="\t") for h in handles]
+        assigned = {}
+        fields = None
+        index = 0
+        # Plain csv.reader rows: only the games column is looked at, rows are copied as-is
+        for path in files:
+            with open(path, encoding="utf-8") as f:
+                reader = csv.reader(f, delimiter="\t")
+                header = next(reader, None)
+                if header is None:
+                    continue
+                if fields is None:
+                    fields = header
+                    for writer in writers:
+                        writer.writerow(fields + [SHARD_INDEX])
+                # Later files may order their columns differently
+                columns = None if header == fields else \
+                    [header.index(f) if f in header else None for f in fields]
+                games_column = header.index("games")
+                for row in reader:
+                    if not row:
+                        continue
+                    games = clean(row[games_column])
+                    shard = assigned.get(games)
+                    if shard is None:
+                        shard = assigned[games] = sizes.index(min(sizes))
+                    sizes[shard] += 1
+                    if columns is not None:
+                        row = [row[c] if c is not None and c < len(row) else "" for c in columns]
+                    elif len(row) != len(fields):
+                        # Short rows are padded (DictReader would fill in None) and long rows
+                        # trimmed, so the row index always lands in the SHARD_INDEX column
+                        row = (row + [""] * len(fields))[:len(fields)]
+                    row.append(index)
+                    writers[shard].writerow(row)
+                    index += 1
+    finally:
+        for h in handles:
+            h.close()
+    return [path for path, size in zip(paths, sizes) if size]
+
+def build_shard(path):
+    """
+    Builds the collections of one shard file written by split_by_games
+    """
+    builder = CollectionBuilder()
+    for r in iter_tsv(path):
+        builder.add(r, int(r.pop(SHARD_INDEX)))
+    return builder
+
+def build_sharded(files, processes):
+    """
+    Splits the input by Games into one shard file per process, builds each shard in
+    its own process and merges the partial builders. Rows are never held in memory or
+    sent between processes, only the encoded builders come back. The merged builder
+    produces byte-identical output to a serial pass.
+    """
+    merged = CollectionBuilder()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = split_by_games(files, directory, processes)
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for builder in pool.map(build_shard, paths):
+                merged.merge(builder)
+    return merged
+
+
+# ── 2. COUNTRIES COLLECTION ────────────────────────────────────────────────
+def country_collection(country_rows):
+    collection = []
+    for r in country_rows:
+        noc = clean(r.get("NOC"))
+        if not noc:
+            continue
+        collection.append({
+            "noc": noc,
+            "official_name": clean(r.get("official_name_en")),
+            "continent": clean(r.get("Continent")),
+            "capital": clean(r.get("Capital")),
+        })
+    return collection
+
+
+# ── 6. WRITE OUTPUT ───────────────────────────────────────────────────────
+def write_json(collections, path=OUTPUT_FILE):
+    """
+    Writes every collection into one indented JSON document and returns the counts.
+    Refuses anything but the full set, since the file is always rewritten as a whole.
+    """
+    output = dict(collections)
+    missing = [name for name in COLLECTIONS if name not in output]
+    if missing:
+        raise ValueError(f"Refusing to write {path} without the {', '.join(missing)} collection(s)")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    return {name: len(docs) for name, docs in output.items()}
+
+def ndjson_path(directory, name, compress=False):
+    return os.path.join(directory, f"{name}.ndjson" + (".gz" if compress else ""))
+
+def open_ndjson(path, mode="rt"):
+    if path.endswith(".gz"):
+        # mtime=0 keeps the gzip header, and so the file hash, identical between runs
+        return io.TextIOWrapper(gzip.GzipFile(path, mode.replace("t", "b"), mtime=0), encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+def iter_ndjson(path):
+    """
+    Yields one document per line of a (optionally gzipped) NDJSON file
+    """
+    with open_ndjson(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def write_ndjson(collections, directory=NDJSON_DIR, compress=False):
+    """
+    Writes one newline-delimited JSON file per collection and returns the counts.
+    Collections are written (and released) one at a time.
+    """
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for name, docs in collections:
+        with open_ndjson(ndjson_path(directory, name, compress), "wt") as f:
+            for doc in docs:
+                f.write(json.dumps(doc, ensure_ascii=False, separators=(",", ":")))
+                f.write("\n")
+        counts[name] = len(docs)
+        del docs
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the Olympics TSVs into MongoDB collections")
+    parser.add_argument("--inputs", nargs="+", default=FILES, help="athlete-event TSV files")
+    parser.add_argument("--countries", default=COUNTRY_FILE, help="country information TSV")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json",
+                        help="one indented olympics.json, or one NDJSON file per collection")
+    parser.add_argument("--output", help=f"output file (json) or directory (ndjson); "
+                                         f"defaults to {OUTPUT_FILE} / {NDJSON_DIR}")
+    parser.add_argument("--gzip", action="store_true", help="gzip-compress NDJSON output")
+    parser.add_argument("--columnar", metavar="DIR",
+                        help="also export results and participation tables to DIR (needs pyarrow)")
+    parser.add_argument("--columnar-format", choices=["parquet", "arrow"], default="parquet",
+                        help="file format of the columnar export")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="split the input by Games and convert the shards in this many processes")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every collection even if the build manifest says it is current")
+    return parser.parse_args(argv)
+
+
+def output_paths(args):
+    """
+    Returns (target, {collection: file it is written to}) for the chosen output format
+    """
+    if args.format == "ndjson":
+        target = args.output or NDJSON_DIR
+        return target, {name: ndjson_path(target, name, args.gzip) for name in COLLECTIONS}
+    target = args.output or OUTPUT_FILE
+    return target, {name: target for name in COLLECTIONS}
+
+
+def main(argv=None):
+    import build_cache
+
+    args = parse_args(argv)
+    start = time.perf_counter()
+
+    # ── BUILD CACHE ───────────────────────────────────────────────────────
+    target, paths = output_paths(args)
+    manifest_path = os.path.join(os.path.dirname(os.path.abspath(target)), build_cache.MANIFEST_FILE)
+    manifest = build_cache.load_manifest(manifest_path)
+    salt = build_cache.combined_hash([build_cache.file_hash(__file__), args.format, args.gzip])
+    fingerprints = build_cache.input_fingerprints(args.inputs, args.countries, salt)
+    stale = set(COLLECTIONS) if args.force else \
+        build_cache.stale_collections(manifest.get(target), fingerprints, paths)
+    # A single olympics.json cannot be partially rewritten
+    if stale and args.format == "json":
+        stale = set(COLLECTIONS)
+
+    if not stale and not args.columnar:
+        print(f"Inputs unchanged since the last build of {target}; nothing to convert")
+        return
+
+    # ── CONVERT ───────────────────────────────────────────────────────────
+    builder = None
+    if args.columnar or stale & set(build_cache.TSV_COLLECTIONS):
+        # More processes than CPUs only adds splitting and merging work
+        processes = min(args.processes, os.cpu_count() or 1)
+        if processes > 1:
+            builder = build_sharded(args.inputs, processes)
+        else:
+            builder = CollectionBuilder().add_all(iter_rows(args.inputs))
+
+    # The columnar export reads the encoded builder directly, so it runs before the
+    # builder is consumed into documents
+    columnar_counts = None
+    if args.columnar:
+        from columnar_export import write_columnar
+        columnar_counts = write_columnar(builder, args.columnar, args.columnar_format)
+
+    # Outputs and manifest are only touched when a collection is stale; a --columnar
+    # run over unchanged inputs leaves them as they are
+    counts = {}
+    if stale:
+        if builder is not None:
+            collections = builder.collections(iter_tsv(args.countries))
+        else:
+            collections = [("countries", country_collection(iter_tsv(args.countries)))]
+        collections = ((name, docs) for name, docs in collections if name in stale)
+
+        if args.format == "ndjson":
+            counts = write_ndjson(collections, target, compress=args.gzip)
+        else:
+            counts = write_json(collections, target)
+
+        manifest[target] = build_cache.record_outputs(manifest.get(target), fingerprints, paths, counts)
+        build_cache.save_manifest(manifest, manifest_path)
+
+    elapsed = time.perf_counter() - start
+    print(f"Done! Written to {target}" if stale else f"Inputs unchanged since the last build of {target}")
+    for name in COLLECTIONS:
+        label = f"{name.capitalize()}:"
+        print(f"  {label:<10} {counts[name] if name in counts else 'unchanged'}")
+    if columnar_counts:
+        print(f"  Columnar:  {columnar_counts['results']} result rows, "
+              f"{columnar_counts['participation']} participation rows in {args.columnar}")
+    if builder is not None:
+        print(f"  Rows:      {builder.rows} in {elapsed:.2f}s "
+              f"({builder.rows / elapsed if elapsed else 0:,.0f} rows/sec)")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"  Peak RSS:  {rss:.1f} MB")
+
 
-games_collections = []
-for gd in games.values():
-    gd["events"] = sorted(gd["events"])
-    # Serialize athletes dict → list with events as sorted list
-    gd["athletes"] = [
-        {"athlete_id": aid, "name": info["name"], "events": sorted(info["events"])}
-        for aid, info in sorted(gd["athletes"].items())
-    ]
-    gd["medal_results"].sort(key=lambda x: (x["event"] or "", x["medal"] or ""))
-    del gd["_medal_set"]
-    games_collections.append(gd)
-games_collections.sort(key=lambda x: (x["year"] or 0, x["season"] or ""))
-
-# ── 5. RESULTS COLLECTION ─────────────────────────────────────────────────
-result_set = set()
-results_collection = []
-
-for r in rows:
-    medal = clean(r["medal"])
-    if not medal:
-        continue
-
-    aid = r["athlete_id"].strip()
-    event = clean(r["event"])
-    games_name = clean(r["games"])
-    noc = clean(r["noc"])
-
-    key = (aid, event, games_name, medal)
-    if key in result_set:
-        continue
-    result_set.add(key)
-
-    results_collection.append({
-        "athlete_id": aid,
-        "athlete_name": clean(r["name"]),
-        "sex": clean(r["sex"]),
-        "noc": noc,
-        "games": games_name,
-        "year": to_int(r["year"]),
-        "season": clean(r["season"]),
-        "sport": clean(r["sport"]),
-        "event": event,
-        "medal": medal,
-    })
-
-results_collection.sort(key=lambda x: (x["year"] or 0, x["games"] or "", x["event"] or ""))
-
-# ── 6. WRITE JSON ─────────────────────────────────────────────────────────
-output = {
-    "athletes": athlete_collection,
-    "countries": country_collection,
-    "events": event_collection,
-    "games": games_collections,
-    "results": results_collection,
-}
-
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    json.dump(output, f, indent=2, ensure_ascii=False)
-
-print(f"Done! Written to {OUTPUT_FILE}")
-print(f"  Athletes:  {len(athlete_collection)}")
-print(f"  Countries: {len(country_collection)}")
-print(f"  Events:    {len(event_collection)}")
-print(f"  Games:     {len(games_collections)}")
-print(f"  Results:   {len(results_collection)}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
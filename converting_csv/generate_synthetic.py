@@ -0,0 +1,148 @@
+"""
+Synthetic Olympics TSV generator for scaling tests.
+
+Writes files with the same 17-column schema as olympics.tsv so the converter and
+importer can be exercised at many times the size of the real data. Distributions
+are modelled on the real TSVs:
+    - Games alternate Summer / Winter every two years, and the field grows over time
+      (Summer Games are roughly 3.5x the size of Winter Games)
+    - athletes return for later Games with some probability, building multi-Games histories
+    - events per athlete per Games follow the observed 1..6+ distribution
+    - about 10% of athlete-event rows win a medal, split evenly Gold / Silver / Bronze
+    - the share of female athletes rises from ~2% to ~48% across the timeline
+
+Usage:
+    python generate_synthetic.py --scale 10 --output synthetic_10x.tsv
+"""
+import argparse
+import csv
+import random
+
+COLUMNS = ["athlete_id", "name", "sex", "birth_year", "birth_day", "birth_place", "height",
+           "weight", "team", "noc", "games", "year", "season", "city", "sport", "event", "medal"]
+
+# Roughly the size of the real dataset at scale 1
+BASE_GAMES = 52
+BASE_SUMMER_ATHLETES = 6000
+BASE_WINTER_ATHLETES = 1700
+
+# Observed share of athletes entering 1, 2, ... 6 events at one Games
+EVENTS_PER_ATHLETE_WEIGHTS = [35, 30, 17, 9, 5, 3, 1]
+MEDAL_RATE = 0.10
+RETURN_RATE = 0.35
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+
+
+def make_sports(rng, season, count, events_per_sport=8):
+    """
+    Returns {sport: [event names]} with separate men's and women's events
+    """
+    sports = {}
+    for i in range(count):
+        sport = f"{season} Sport {i + 1}"
+        events = []
+        for j in range(events_per_sport):
+            events.append(f"{sport} Event {j + 1}, Men")
+            events.append(f"{sport} Event {j + 1}, Women")
+        sports[sport] = events
+    return sports
+
+
+def make_nocs(count):
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return [letters[i // 676 % 26] + letters[i // 26 % 26] + letters[i % 26] for i in range(count)]
+
+
+def new_athlete(rng, athlete_id, year, female_share, nocs):
+    sex = "F" if rng.random() < female_share else "M"
+    noc = rng.choice(nocs)
+    height = rng.gauss(168 if sex == "F" else 180, 8)
+    return {
+        "athlete_id": str(athlete_id),
+        "name": f"Athlete {athlete_id}",
+        "sex": sex,
+        "birth_year": str(year - max(15, int(rng.gauss(25, 4)))),
+        "birth_day": f"{rng.randint(1, 28)} {rng.choice(MONTHS)}",
+        "birth_place": f"City {rng.randint(1, 500)} ({noc})",
+        "height": str(round(height)),
+        "weight": str(round(height - 105 + rng.gauss(0, 6))) if rng.random() < 0.8 else "NA",
+        "team": f"Team {noc}",
+        "noc": noc,
+    }
+
+
+def generate_rows(scale=1.0, seed=0):
+    """
+    Yields synthetic TSV rows as dicts. `scale` multiplies the number of Games, so the
+    per-Games distributions stay realistic while the total size grows.
+    """
+    rng = random.Random(seed)
+    nocs = make_nocs(220)
+    sports = {"Summer": make_sports(rng, "Summer", 40), "Winter": make_sports(rng, "Winter", 15)}
+    events_per_athlete = list(range(1, len(EVENTS_PER_ATHLETE_WEIGHTS) + 1))
+    n_games = max(1, round(BASE_GAMES * scale))
+
+    next_id = 1
+    veterans = {"Summer": [], "Winter": []}
+    for g in range(n_games):
+        season = "Summer" if g % 2 == 0 else "Winter"
+        year = 1896 + 2 * g
+        progress = g / max(1, n_games - 1)
+        # Field size grows over the timeline, as the real Games did
+        base = BASE_SUMMER_ATHLETES if season == "Summer" else BASE_WINTER_ATHLETES
+        n_athletes = max(10, int(base * (0.1 + 0.9 * progress)))
+        female_share = 0.02 + 0.46 * progress
+
+        games_name = f"{year} {season} Olympics"
+        city = f"Host City {g + 1}"
+        returning = [a for a in veterans[season] if rng.random() < RETURN_RATE][:n_athletes // 2]
+        athletes = list(returning)
+        while len(athletes) < n_athletes:
+            athletes.append(new_athlete(rng, next_id, year, female_share, nocs))
+            next_id += 1
+        veterans[season] = athletes
+
+        for athlete in athletes:
+            sport = rng.choice(list(sports[season]))
+            suffix = ", Women" if athlete["sex"] == "F" else ", Men"
+            pool = [e for e in sports[season][sport] if e.endswith(suffix)]
+            k = rng.choices(events_per_athlete, EVENTS_PER_ATHLETE_WEIGHTS)[0]
+            for event in rng.sample(pool, min(k, len(pool))):
+                medal = rng.choice(["Gold", "Silver", "Bronze"]) if rng.random() < MEDAL_RATE else "NA"
+                yield dict(athlete, games=games_name, year=str(year), season=season,
+                           city=city, sport=sport, event=event, medal=medal)
+
+
+def write_tsv(path, rows):
+    """
+    Writes rows in the olympics.tsv layout and returns the number written
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, delimiter="\t", lineterminator="\n")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def generate(path, scale=1.0, seed=0):
+    return write_tsv(path, generate_rows(scale, seed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Olympics TSV")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiple of the real data size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="synthetic.tsv")
+    args = parser.parse_args(argv)
+
+    rows = generate(args.output, args.scale, args.seed)
+    print(f"Wrote {rows} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
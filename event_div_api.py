@@ -14,17 +14,131 @@ Event Diversity & Specialization API:
     4) Which countries have the broadest event participation?
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Union, Tuple, Callable
 from pymongo import MongoClient
+import datetime
+import math
 import matplotlib.pyplot as plt
 
+from connection import get_client, get_db
+from sketches import load_sketches, ranked_estimates, relative_error, PRECISION
+from incidence import IncidenceIndex
+
+# Birth-cohort buckets start here unless a min_birth_year is given (before the oldest Olympian)
+FIRST_BIRTH_YEAR = 1800
+COHORT_QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+
+def quantiles(histogram: Dict[int, int], points=COHORT_QUANTILES) -> Dict[str, int]:
+    """
+    Nearest-rank quantiles of event counts from a {event_count: athletes} histogram
+    """
+    total = sum(histogram.values())
+    result: Dict[str, int] = {}
+    if not total:
+        return result
+    values = sorted(histogram.items())
+    for p in points:
+        rank, seen = max(1, math.ceil(p * total)), 0
+        for value, count in values:
+            seen += count
+            if seen >= rank:
+                result[f"p{round(p * 100)}"] = value
+                break
+    return result
+
+
+def rates(medalists: int, medals: int, athletes: int) -> Dict[str, Any]:
+    return {
+        "medalists": medalists,
+        "medal_rate": round(medalists / athletes, 4) if athletes else 0,
+        "medals_per_athlete": round(medals / athletes, 3) if athletes else 0,
+    }
+
 
 class EventDiversityAPI:
 
-    def __init__(self, db_name: str = "olympics", collection_name: str = "athletes"):
-        client = MongoClient()
-        self.db = client[db_name]
+    def __init__(
+            self,
+            db_name: Optional[str] = None,
+            collection_name: str = "athletes",
+            stream: bool = False,
+            batch_size: Optional[int] = None,
+            approximate: bool = False,
+            client: Optional[MongoClient] = None,
+    ):
+        # One shared connection pool per process unless a client is passed in
+        client = client if client is not None else get_client()
+        # db_name defaults to MONGODB_DB (see connection.get_db), like china_rise_api
+        self.db = get_db(db_name, client)
         self.athletes = self.db[collection_name]
+        # stream=True returns lazily consumed cursors instead of lists, fetched batch_size at a time
+        self.stream = stream
+        self.batch_size = batch_size
+        # approximate=True answers distinct counts from the stored HyperLogLog sketches
+        self.approximate = approximate
+        self._sketches: Dict[str, Dict] = {}
+        self._incidence: Optional[IncidenceIndex] = None
+
+    def run(
+            self,
+            pipeline: List[Dict[str, Any]],
+            allow_disk_use: bool = False,
+    ) -> Union[List[Dict[str, Any]], Iterator[Dict[str, Any]]]:
+        """
+        Runs a pipeline on the athletes collection: a list, or the cursor itself in stream mode
+        """
+        options: Dict[str, Any] = {}
+        if self.batch_size:
+            options["batchSize"] = self.batch_size
+        if allow_disk_use:
+            options["allowDiskUse"] = True
+        cursor = self.athletes.aggregate(pipeline, **options)
+        return cursor if self.stream else list(cursor)
+
+    def sketches(self, kind: str) -> Dict:
+        """
+        Loads (once) the stored HyperLogLog sketches of one kind; empty if none were built
+        """
+        if kind not in self._sketches:
+            self._sketches[kind] = load_sketches(self.db, kind)
+        return self._sketches[kind]
+
+    def incidence(self) -> IncidenceIndex:
+        """
+        Loads (once) the NOC × event incidence index; falsy if it was never built
+        """
+        if self._incidence is None:
+            self._incidence = IncidenceIndex.load(self.db)
+        return self._incidence
+
+    def use_sketches(self, approximate: Optional[bool], kind: str) -> bool:
+        if approximate is None:
+            approximate = self.approximate
+        return approximate and bool(self.sketches(kind))
+
+    @staticmethod
+    def approximate_error() -> Dict[str, Any]:
+        """
+        Error bound of approximate-mode counts: relative standard error of the sketches,
+        and the ±2σ range about 95% of estimates fall within
+        """
+        error = relative_error(PRECISION)
+        return {"precision": PRECISION, "relative_std_error": round(error, 4), "within_95pct": round(2 * error, 4)}
+
+    def rows(self, rows: List[Dict[str, Any]]) -> Union[List[Dict[str, Any]], Iterator[Dict[str, Any]]]:
+        return iter(rows) if self.stream else rows
+
+    def run_facet(
+            self,
+            pipeline: List[Dict[str, Any]],
+            shape: Callable[[Dict[str, Any]], List[Dict[str, Any]]],
+    ) -> Union[List[Dict[str, Any]], Iterator[Dict[str, Any]]]:
+        """
+        Runs a pipeline ending in $facet (a single document) and turns it into rows with shape()
+        """
+        doc = next(iter(self.run(pipeline, allow_disk_use=True)), {})
+        return self.rows(shape(doc))
 
     def base_pipeline(
             self,
@@ -83,13 +197,19 @@ class EventDiversityAPI:
 
         How it works:
         - Filter (optional)
-        - Compute number of events as length of events array using $size
-        - Sort by that count descending
+        - Sort by the stored event_count (the length of the events array, written at
+          conversion / import) descending
         - Limit to top_n
+        The (sex / nocs, event_count) indexes serve the filter and the sort together, so
+        the server walks the index and stops after top_n documents.
         """
 
         pipeline = self.base_pipeline(sex=sex, noc=noc) + [
-            {"$addFields": {"event_count": {"$size": "$events"}}},
+            # Sort by event_count (largest first)
+            {"$sort": {"event_count": -1}},
+
+            # Only keep the top N to get athelete with most events
+            {"$limit": top_n},
 
             {"$project": {
                 "_id": 0,
@@ -100,21 +220,16 @@ class EventDiversityAPI:
                 "birth_year": 1,
                 "event_count": 1
             }},
-
-            # Sort by event_count (largest first)
-            {"$sort": {"event_count": -1}},
-
-            # Only keep the top N to get athelete with most events
-            {"$limit": top_n},
         ]
 
-        return list(self.athletes.aggregate(pipeline))
+        return self.run(pipeline)
 
     def top_events_by_athlete_count(
             self,
             top_n: int = 20,
             sex: Optional[str] = None,
-            noc: Optional[str] = None
+            noc: Optional[str] = None,
+            approximate: Optional[bool] = None,
     ) -> List[Dict[str, Any]]:
         """
         Returns events that show up for the most unique athletes.
@@ -122,31 +237,39 @@ class EventDiversityAPI:
         How it works:
         - Filter (optional)
         - $unwind events: turns each athlete document into multiple rows (one per event)
-        - Group by event, counting distinct athlete_ids
+        - Group by (event, athlete_id), then count those groups per event: no per-event
+          set of athlete_ids is ever held, and groups can spill to disk
         - Sort and limit
+
+        With approximate=True (or the constructor default), counts come from the per-event
+        HyperLogLog sketches instead, within the error bound from approximate_error().
+        There are no per-NOC event sketches, so a noc filter always counts exactly.
         """
 
+        if noc is None and self.use_sketches(approximate, "event_athletes"):
+            ranked = ranked_estimates(self.sketches("event_athletes"), sex=sex)
+            return self.rows([{"event": event, "unique_athletes": count} for event, count in ranked[:top_n]])
+
         pipeline = self.base_pipeline(sex=sex, noc=noc) + [
             {"$unwind": "$events"},
 
-            # Count unique athletes per event: use $addToSet to build a set of athlete_ids for each event
-            {"$group": {
-                "_id": "$events",
-                "athletes": {"$addToSet": "$athlete_id"}
-            }},
+            # Count unique athletes per event in two stages: one group per (event, athlete) ...
+            {"$group": {"_id": {"event": "$events", "athlete_id": "$athlete_id"}}},
+
+            # ... then count those groups per event
+            {"$group": {"_id": "$_id.event", "unique_athletes": {"$sum": 1}}},
 
-            # Convert set size to a number
             {"$project": {
                 "_id": 0,
                 "event": "$_id",
-                "unique_athletes": {"$size": "$athletes"}
+                "unique_athletes": 1
             }},
 
             {"$sort": {"unique_athletes": -1}},
             {"$limit": top_n},
         ]
 
-        return list(self.athletes.aggregate(pipeline))
+        return self.run(pipeline, allow_disk_use=True)
 
     def avg_event_count_by_sex(self) -> List[Dict[str, Any]]:
         """
@@ -180,49 +303,255 @@ class EventDiversityAPI:
             {"$sort": {"sex": 1}}
         ]
 
-        return list(self.athletes.aggregate(pipeline))
+        return self.run(pipeline)
 
-    def top_nocs_by_event_diversity(self, top_n: int = 20) -> List[Dict[str, Any]]:
+    def top_nocs_by_event_diversity(
+            self,
+            top_n: int = 20,
+            approximate: Optional[bool] = None,
+    ) -> List[Dict[str, Any]]:
         """
         Returns NOCs (countries) ranked by how many distinct events their athletes participated in.
 
         How it works:
         - $unwind nocs: athlete may have multiple NOCs
-        - $unwind events: one row per (noc, event) per athlete
-        - Group by noc, collect distinct events using $addToSet
-        - Rank by the size of that set
+        - $unwind events: one row per (noc, event) per athlete, remembering each row's
+          position in the athlete's events array
+        - Group by (noc, event); the rows at position 0 count each athlete exactly once
+        - Group by noc: the number of (noc, event) groups is the distinct event count
+        - Rank by that count
+
+        When the NOC × event incidence index has been built, the exact ranking is read
+        from its bitsets in memory instead. Without it, approximate=True (or the
+        constructor default) reads the per-NOC HyperLogLog sketches, within the error
+        bound from approximate_error().
         """
 
+        if self.incidence():
+            return self.rows(self.incidence().ranking(top_n))
+
+        if self.use_sketches(approximate, "noc_events") and self.sketches("noc_athletes"):
+            athletes = dict(ranked_estimates(self.sketches("noc_athletes")))
+            ranked = ranked_estimates(self.sketches("noc_events"))
+            return self.rows([
+                {"noc": noc, "unique_events": count, "unique_athletes": athletes.get(noc, 0)}
+                for noc, count in ranked[:top_n]
+            ])
+
         pipeline = [
             {"$unwind": "$nocs"},
-            {"$unwind": "$events"},
+            {"$unwind": {"path": "$events", "includeArrayIndex": "event_index"}},
 
+            # One group per (noc, event) instead of a set of events per noc
             {"$group": {
-                "_id": "$nocs",
-                "events": {"$addToSet": "$events"},
-                "athletes": {"$addToSet": "$athlete_id"}
+                "_id": {"noc": "$nocs", "event": "$events"},
+                "athletes": {"$sum": {"$cond": [{"$eq": ["$event_index", 0]}, 1, 0]}}
+            }},
+
+            {"$group": {
+                "_id": "$_id.noc",
+                "unique_events": {"$sum": 1},
+                "unique_athletes": {"$sum": "$athletes"},
             }},
 
             {"$project": {
                 "_id": 0,
                 "noc": "$_id",
-                "unique_events": {"$size": "$events"},
-                "unique_athletes": {"$size": "$athletes"},
+                "unique_events": 1,
+                "unique_athletes": 1,
             }},
 
             {"$sort": {"unique_events": -1}},
             {"$limit": top_n},
         ]
 
-        return list(self.athletes.aggregate(pipeline))
+        return self.run(pipeline, allow_disk_use=True)
+
+    @staticmethod
+    def medal_stages() -> List[Dict[str, Any]]:
+        """
+        Stages adding each athlete's medal count from results (one document per medal),
+        keeping only the fields the cohort methods use
+        """
+        return [
+            {"$project": {"_id": 0, "athlete_id": 1, "birth_year": 1, "event_count": 1}},
+            # Indexed lookup: the results unique index starts with athlete_id
+            {"$lookup": {
+                "from": "results",
+                "localField": "athlete_id",
+                "foreignField": "athlete_id",
+                "pipeline": [{"$project": {"_id": 1}}],
+                "as": "medals",
+            }},
+            {"$set": {"medals": {"$size": "$medals"}}},
+        ]
+
+    def birth_cohorts(
+            self,
+            bucket_years: int = 10,
+            sex: Optional[str] = None,
+            noc: Optional[str] = None,
+            min_birth_year: Optional[int] = None,
+            max_birth_year: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Event-count distribution, quantiles and medal rates per birth cohort, in one query.
+
+        How it works:
+        - Filter with base_pipeline; the birth_year range always applies (from
+          FIRST_BIRTH_YEAR / this year by default), so the birth_year indexes serve it
+          and athletes without a birth year drop out
+        - Look up each athlete's medal count from results
+        - $facet, in one pass over the shared documents:
+            cohorts: $bucket by birth_year every bucket_years years → athletes, average /
+                     min / max events, medalists and medals
+            distribution: $group by (cohort, event_count) → the histogram quantiles come from
+
+        Returns:
+            one row per non-empty cohort, oldest first. Cohort labels are clamped to the
+            birth-year range, so min_birth_year=1985 gives "1985-1989", not "1980-1989".
+            An empty range (min_birth_year > max_birth_year) has no cohorts.
+        """
+        lowest = min_birth_year if min_birth_year is not None else FIRST_BIRTH_YEAR
+        last = max_birth_year if max_birth_year is not None else datetime.date.today().year
+        if lowest > last:
+            return self.rows([])
+        first = lowest - lowest % bucket_years
+        boundaries = list(range(first, last + bucket_years + 1, bucket_years))
+        cohort = {"$subtract": ["$birth_year", {"$mod": [{"$subtract": ["$birth_year", first]}, bucket_years]}]}
+
+        pipeline = self.base_pipeline(
+            sex=sex, noc=noc,
+            min_birth_year=lowest,
+            max_birth_year=last,
+        ) + self.medal_stages() + [
+            {"$facet": {
+                "cohorts": [{"$bucket": {
+                    "groupBy": "$birth_year",
+                    "boundaries": boundaries,
+                    "output": {
+                        "athletes": {"$sum": 1},
+                        "avg_events": {"$avg": "$event_count"},
+                        "min_events": {"$min": "$event_count"},
+                        "max_events": {"$max": "$event_count"},
+                        "medalists": {"$sum": {"$cond": [{"$gt": ["$medals", 0]}, 1, 0]}},
+                        "medals": {"$sum": "$medals"},
+                    },
+                }}],
+                "distribution": [{"$group": {
+                    "_id": {"cohort": cohort, "events": "$event_count"},
+                    "athletes": {"$sum": 1},
+                }}],
+            }},
+        ]
+
+        def shape(doc):
+            histograms: Dict[int, Dict[int, int]] = {}
+            for d in doc.get("distribution", []):
+                histograms.setdefault(d["_id"]["cohort"], {})[d["_id"]["events"]] = d["athletes"]
+            rows = []
+            for c in doc.get("cohorts", []):
+                histogram = dict(sorted(histograms.get(c["_id"], {}).items()))
+                rows.append({
+                    "cohort": f"{max(c['_id'], lowest)}-{min(c['_id'] + bucket_years - 1, last)}",
+                    "athletes": c["athletes"],
+                    "avg_events": round(c["avg_events"], 2),
+                    "min_events": c["min_events"],
+                    "max_events": c["max_events"],
+                    **quantiles(histogram),
+                    **rates(c["medalists"], c["medals"], c["athletes"]),
+                    "event_count_distribution": histogram,
+                })
+            return rows
+
+        return self.run_facet(pipeline, shape)
+
+    def compare_birth_cohorts(
+            self,
+            cohorts: List[Tuple[int, int]],
+            sex: Optional[str] = None,
+            noc: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Compares any birth-year ranges (they may overlap) in one query.
+
+        How it works:
+        - One index-backed birth_year range covering every cohort, one medal lookup
+        - A $facet branch per cohort: $match its range, $group by event_count
+        - Totals, averages, quantiles and medal rates are computed from each histogram
+
+        Parameters:
+            cohorts: (first birth year, last birth year) pairs, inclusive
+        """
+        cohorts = [tuple(c) for c in cohorts]
+        if not cohorts:
+            return self.rows([])
+        pipeline = self.base_pipeline(
+            sex=sex, noc=noc,
+            min_birth_year=min(lo for lo, _ in cohorts),
+            max_birth_year=max(hi for _, hi in cohorts),
+        ) + self.medal_stages() + [
+            {"$facet": {
+                f"c{i}": [
+                    {"$match": {"birth_year": {"$gte": lo, "$lte": hi}}},
+                    {"$group": {
+                        "_id": "$event_count",
+                        "athletes": {"$sum": 1},
+                        "medalists": {"$sum": {"$cond": [{"$gt": ["$medals", 0]}, 1, 0]}},
+                        "medals": {"$sum": "$medals"},
+                    }},
+                ]
+                for i, (lo, hi) in enumerate(cohorts)
+            }},
+        ]
+
+        def shape(doc):
+            rows = []
+            for i, (lo, hi) in enumerate(cohorts):
+                groups = sorted(doc.get(f"c{i}", []), key=lambda g: g["_id"])
+                histogram = {g["_id"]: g["athletes"] for g in groups}
+                athletes = sum(histogram.values())
+                rows.append({
+                    "cohort": f"{lo}-{hi}",
+                    "athletes": athletes,
+                    "avg_events": round(sum(e * n for e, n in histogram.items()) / athletes, 2) if athletes else None,
+                    "min_events": groups[0]["_id"] if groups else None,
+                    "max_events": groups[-1]["_id"] if groups else None,
+                    **quantiles(histogram),
+                    **rates(sum(g["medalists"] for g in groups), sum(g["medals"] for g in groups), athletes),
+                    "event_count_distribution": histogram,
+                })
+            return rows
+
+        return self.run_facet(pipeline, shape)
+
+    def noc_event_count(self, noc: str) -> int:
+        """
+        Number of distinct events the athletes of one NOC have entered
+        """
+        if self.incidence():
+            return self.incidence().event_count(noc)
+        return len(self.athletes.distinct("events", {"nocs": noc}))
+
+    def common_events(self, noc_a: str, noc_b: str) -> List[str]:
+        """
+        Events that athletes of both NOCs have entered, alphabetically
+        """
+        if self.incidence():
+            return self.incidence().common_events(noc_a, noc_b)
+        return sorted(set(self.athletes.distinct("events", {"nocs": noc_a}))
+                      & set(self.athletes.distinct("events", {"nocs": noc_b})))
 
     def plot_top_events_by_athlete_count(self, top_n: int = 10) -> None:
         """
         Horizontal bar chart of top N events by unique athlete participation.
         """
-        data = self.top_events_by_athlete_count()
+        self.plot_events(self.top_events_by_athlete_count(), top_n)
+
+    @staticmethod
+    def plot_events(data: List[Dict[str, Any]], top_n: int) -> None:
         # Reversed so that top event is at the top of the chart for aesthetic and readability
-        data = list(reversed(data))
+        data = list(reversed(list(data)))
 
         events = [d["event"] for d in data]
         counts = [d["unique_athletes"] for d in data]
@@ -0,0 +1,170 @@
+"""
+Olympics Analysis Using MongoDB
+
+Async Event Diversity API:
+    The same questions as EventDiversityAPI, driven by PyMongo's asyncio client, so a
+    dashboard can await independent aggregations together instead of one after another.
+
+    Every query method keeps EventDiversityAPI's signature and returns an awaitable:
+        api = AsyncEventDiversityAPI(timeout=10)
+        await api.load_indexes()
+        top, by_sex = await asyncio.gather(api.top_events_by_athlete_count(), api.avg_event_count_by_sex())
+
+    Timeouts: `timeout` (seconds) is a PyMongo client-side operation timeout (timeoutMS):
+    the driver derives maxTimeMS from it and fails the operation once it runs out, so
+    in-flight operations are never cancelled from outside, which can leave the client
+    unable to close. Cancelling an awaiting task still closes its server cursor.
+
+    Usage:
+        python event_div_async_api.py        # checks close() still works after a timeout
+"""
+from typing import List, Dict, Any, Optional
+import asyncio
+import time
+from pymongo import AsyncMongoClient, timeout as operation_timeout
+
+from connection import get_async_client, get_db
+from event_div_api import EventDiversityAPI
+from incidence import IncidenceIndex, INCIDENCE_COLLECTION
+from sketches import sketches_from_docs, SKETCH_COLLECTION, KINDS
+
+
+class AsyncEventDiversityAPI(EventDiversityAPI):
+
+    def __init__(
+            self,
+            db_name: Optional[str] = None,
+            collection_name: str = "athletes",
+            approximate: bool = False,
+            timeout: Optional[float] = None,
+            client: Optional[AsyncMongoClient] = None,
+    ):
+        # Not calling EventDiversityAPI.__init__, which would open a blocking client
+        self.client = client if client is not None else get_async_client()
+        self.db = get_db(db_name, self.client)
+        self.athletes = self.db[collection_name]
+        self.stream = False
+        self.batch_size = None
+        self.approximate = approximate
+        self.timeout = timeout
+        # Filled by load_indexes(); until then queries run the aggregation pipelines
+        self._sketches: Dict[str, Dict] = {}
+        self._incidence = IncidenceIndex()
+
+    async def load_indexes(self) -> None:
+        """
+        Loads the incidence index and sketches, which the synchronous API reads lazily
+        """
+        incidence, *sketches = await asyncio.gather(
+            self.fetch(self.db[INCIDENCE_COLLECTION].find({}, {"_id": 0})),
+            *(self.fetch(self.db[SKETCH_COLLECTION].find({"kind": kind}, {"_id": 0})) for kind in KINDS),
+        )
+        self._incidence = IncidenceIndex.from_docs(incidence)
+        self._sketches = {kind: sketches_from_docs(docs) for kind, docs in zip(KINDS, sketches)}
+
+    def incidence(self) -> IncidenceIndex:
+        return self._incidence
+
+    def sketches(self, kind: str) -> Dict:
+        return self._sketches.get(kind, {})
+
+    async def fetch(self, cursor) -> List[Dict[str, Any]]:
+        """
+        Drains a cursor within the timeout, closing it if it fails or is cancelled
+        """
+        try:
+            with operation_timeout(self.timeout):
+                return await cursor.to_list(None)
+        finally:
+            await cursor.close()
+
+    def run(self, pipeline: List[Dict[str, Any]], allow_disk_use: bool = False):
+        return self._aggregate(pipeline, allow_disk_use)
+
+    async def _aggregate(self, pipeline: List[Dict[str, Any]], allow_disk_use: bool) -> List[Dict[str, Any]]:
+        options = {"allowDiskUse": True} if allow_disk_use else {}
+        with operation_timeout(self.timeout):
+            cursor = await self.athletes.aggregate(pipeline, **options)
+        return await self.fetch(cursor)
+
+    def run_facet(self, pipeline: List[Dict[str, Any]], shape):
+        return self._facet(pipeline, shape)
+
+    async def _facet(self, pipeline: List[Dict[str, Any]], shape) -> List[Dict[str, Any]]:
+        docs = await self._aggregate(pipeline, True)
+        return shape(docs[0] if docs else {})
+
+    def rows(self, rows: List[Dict[str, Any]]):
+        async def ready():
+            return rows
+        return ready()
+
+    async def distinct_events(self, noc: str) -> List[str]:
+        with operation_timeout(self.timeout):
+            return await self.athletes.distinct("events", {"nocs": noc})
+
+    async def noc_event_count(self, noc: str) -> int:
+        if self.incidence():
+            return self.incidence().event_count(noc)
+        return len(await self.distinct_events(noc))
+
+    async def common_events(self, noc_a: str, noc_b: str) -> List[str]:
+        if self.incidence():
+            return self.incidence().common_events(noc_a, noc_b)
+        a, b = await asyncio.gather(self.distinct_events(noc_a), self.distinct_events(noc_b))
+        return sorted(set(a) & set(b))
+
+    async def gather(self, calls: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Awaits named calls together. If any fails or times out, the first error is raised
+        once every call has finished: the operations already bound by the timeout are
+        left to end on their own rather than cancelled mid-flight.
+        """
+        results = await asyncio.gather(*calls.values(), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return dict(zip(calls, results))
+
+    async def report(self, top_n: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        All four event diversity questions, run concurrently
+        """
+        return await self.gather({
+            "top_athletes_by_event_count": self.top_athletes_by_event_count(top_n=top_n),
+            "top_events_by_athlete_count": self.top_events_by_athlete_count(top_n=top_n),
+            "avg_event_count_by_sex": self.avg_event_count_by_sex(),
+            "top_nocs_by_event_diversity": self.top_nocs_by_event_diversity(top_n=top_n),
+        })
+
+    async def plot_top_events_by_athlete_count(self, top_n: int = 10) -> None:
+        self.plot_events(await self.top_events_by_athlete_count(), top_n)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+async def check_close_after_timeout(uri: str = "mongodb://127.0.0.1:1/", timeout: float = 0.3,
+                                    close_within: float = 5.0) -> bool:
+    """
+    Runs report() against an unreachable server so every query times out, then checks
+    that close() still returns. Returns True if it did within close_within seconds.
+    """
+    api = AsyncEventDiversityAPI(timeout=timeout,
+                                 client=get_async_client(uri=uri, timeout_ms=int(timeout * 1000)))
+    try:
+        await api.report()
+    except Exception as error:
+        print(f"report() failed as expected: {type(error).__name__}")
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(api.close(), close_within)
+    except asyncio.TimeoutError:
+        print(f"close() did not return within {close_within}s")
+        return False
+    print(f"close() returned in {time.perf_counter() - start:.2f}s")
+    return True
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if asyncio.run(check_close_after_timeout()) else 1)
@@ -0,0 +1,284 @@
+"""
+Olympics Analysis Using MongoDB
+
+Columnar Event Diversity API:
+    The athletes collection is small enough to hold in memory, so this backend loads it
+    once into NumPy columns and answers EventDiversityAPI's four questions with array
+    operations instead of aggregation pipelines:
+        sex                 int8 codes into `sexes`
+        birth_year          int32, with has_birth_year for nulls
+        events / nocs       CSR layout: offsets[i]:offsets[i + 1] slices athlete i's
+                            interned codes into `event_names` / `noc_names`
+
+    Results match EventDiversityAPI's output shapes; ties are broken by load order where
+    MongoDB leaves them unspecified. numpy is only needed for this backend.
+
+    Usage:
+        python event_div_columnar_api.py            # parity check and per-query latency
+"""
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Callable
+import time
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency, only needed for the columnar backend
+    np = None
+
+from connection import get_db
+
+
+def _intern(values: Iterable[Any], table: Dict[Any, int]) -> List[int]:
+    return [table.setdefault(v, len(table)) for v in values]
+
+
+class AthleteColumns:
+    """
+    Athlete documents as NumPy columns (see the module docstring for the layout)
+    """
+
+    def __init__(self, docs: Iterable[Dict[str, Any]]):
+        if np is None:
+            raise ImportError("The columnar backend needs numpy: pip install numpy")
+        sexes: Dict[Any, int] = {}
+        events: Dict[str, int] = {}
+        nocs: Dict[str, int] = {}
+        self.docs: List[Dict[str, Any]] = []
+        sex, birth_year, event_codes, event_counts, noc_codes, noc_counts = [], [], [], [], [], []
+
+        for doc in docs:
+            # Only the fields the outputs need are kept per athlete
+            self.docs.append({key: doc[key] for key in ("athlete_id", "name", "sex", "birth_year", "nocs")
+                              if key in doc})
+            sex.append(_intern([doc.get("sex")], sexes)[0])
+            birth_year.append(doc.get("birth_year"))
+            athlete_events = doc.get("events") or []
+            athlete_nocs = doc.get("nocs") or []
+            event_codes += _intern(athlete_events, events)
+            event_counts.append(len(athlete_events))
+            noc_codes += _intern(athlete_nocs, nocs)
+            noc_counts.append(len(athlete_nocs))
+
+        self.size = len(self.docs)
+        self.sexes = list(sexes)
+        self.sex = np.array(sex, dtype=np.int8)
+        self.has_birth_year = np.array([y is not None for y in birth_year], dtype=bool)
+        self.birth_year = np.array([y if y is not None else 0 for y in birth_year], dtype=np.int32)
+        self.event_names = list(events)
+        self.event_codes = np.array(event_codes, dtype=np.int32)
+        self.event_offsets = np.concatenate(([0], np.cumsum(event_counts, dtype=np.int64)))
+        self.noc_names = list(nocs)
+        self.noc_codes = np.array(noc_codes, dtype=np.int32)
+        self.noc_offsets = np.concatenate(([0], np.cumsum(noc_counts, dtype=np.int64)))
+        self.event_count = np.diff(self.event_offsets)
+        # Owning athlete of every entry in the CSR arrays
+        self.event_owner = np.repeat(np.arange(self.size), self.event_count)
+        self.noc_owner = np.repeat(np.arange(self.size), np.diff(self.noc_offsets))
+
+    @classmethod
+    def load(cls, collection, batch_size: int = 10000) -> "AthleteColumns":
+        projection = {"_id": 0, "athlete_id": 1, "name": 1, "sex": 1, "birth_year": 1, "nocs": 1, "events": 1}
+        return cls(collection.find({}, projection, batch_size=batch_size))
+
+
+def top_k(values, k: Optional[int]):
+    """
+    Indices of the k largest values, largest first, ties in index order
+    """
+    order = np.argsort(-values, kind="stable")
+    return order[:k] if k else order
+
+
+class ColumnarEventDiversityAPI:
+
+    def __init__(self, db_name: Optional[str] = None, collection_name: str = "athletes", client=None,
+                 columns: Optional[AthleteColumns] = None):
+        self.athletes = get_db(db_name, client)[collection_name]
+        self._columns = columns
+
+    @property
+    def columns(self) -> AthleteColumns:
+        """
+        The athlete columns, loaded from MongoDB on first use
+        """
+        if self._columns is None:
+            self._columns = AthleteColumns.load(self.athletes)
+        return self._columns
+
+    def reload(self) -> None:
+        self._columns = None
+
+    def base_mask(
+            self,
+            sex: Optional[str] = None,
+            noc: Optional[str] = None,
+            min_birth_year: Optional[int] = None,
+            max_birth_year: Optional[int] = None,
+    ):
+        """
+        Boolean mask over athletes with the same filters as EventDiversityAPI.base_pipeline
+        """
+        c = self.columns
+        mask = np.ones(c.size, dtype=bool)
+        if sex is not None:
+            mask &= c.sex == (c.sexes.index(sex) if sex in c.sexes else -1)
+        if noc is not None:
+            has_noc = np.zeros(c.size, dtype=bool)
+            if noc in c.noc_names:
+                has_noc[c.noc_owner[c.noc_codes == c.noc_names.index(noc)]] = True
+            mask &= has_noc
+        # Like $gte / $lte, a range never matches a missing birth year
+        if min_birth_year is not None:
+            mask &= c.has_birth_year & (c.birth_year >= min_birth_year)
+        if max_birth_year is not None:
+            mask &= c.has_birth_year & (c.birth_year <= max_birth_year)
+        return mask
+
+    def top_athletes_by_event_count(
+            self,
+            top_n: int = 20,
+            sex: Optional[str] = None,
+            noc: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Athletes with the most events: event counts are the CSR offset differences
+        """
+        c = self.columns
+        selected = np.flatnonzero(self.base_mask(sex=sex, noc=noc))
+        counts = c.event_count[selected]
+        return [dict(c.docs[i], event_count=int(c.event_count[i])) for i in selected[top_k(counts, top_n)]]
+
+    def top_events_by_athlete_count(
+            self,
+            top_n: int = 20,
+            sex: Optional[str] = None,
+            noc: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Events with the most unique athletes: unique (athlete, event) pairs, then a bincount
+        """
+        c = self.columns
+        entries = self.base_mask(sex=sex, noc=noc)[c.event_owner]
+        n_events = len(c.event_names)
+        pairs = np.unique(c.event_owner[entries].astype(np.int64) * n_events + c.event_codes[entries])
+        counts = np.bincount(pairs % n_events, minlength=n_events)
+        return [{"event": c.event_names[e], "unique_athletes": int(counts[e])}
+                for e in top_k(counts, top_n) if counts[e]]
+
+    def avg_event_count_by_sex(self) -> List[Dict[str, Any]]:
+        """
+        Average / min / max events per athlete for each sex
+        """
+        c = self.columns
+        counts = c.event_count
+        rows = []
+        for code, sex in enumerate(c.sexes):
+            group = counts[c.sex == code]
+            rows.append({
+                "sex": sex,
+                "avg_events_per_athlete": round(float(group.sum()) / len(group), 2),
+                "min_events": int(group.min()),
+                "max_events": int(group.max()),
+                "athletes": int(len(group)),
+            })
+        # MongoDB sorts null before strings
+        return sorted(rows, key=lambda r: (r["sex"] is not None, r["sex"] or ""))
+
+    def top_nocs_by_event_diversity(self, top_n: int = 20) -> List[Dict[str, Any]]:
+        """
+        NOCs by distinct events: every (noc, event) pair of each athlete's nocs × events,
+        deduplicated, then counted per NOC
+        """
+        c = self.columns
+        events_per = c.event_count[c.noc_owner]
+        # One row per (noc entry, event of the same athlete)
+        noc_rows = np.repeat(np.arange(len(c.noc_codes)), events_per)
+        starts = np.repeat(np.cumsum(events_per) - events_per, events_per)
+        event_index = c.event_offsets[c.noc_owner[noc_rows]] + np.arange(len(noc_rows)) - starts
+
+        n_events, n_nocs = len(c.event_names), len(c.noc_names)
+        pairs = np.unique(c.noc_codes[noc_rows].astype(np.int64) * n_events + c.event_codes[event_index])
+        unique_events = np.bincount(pairs // n_events, minlength=n_nocs)
+        # Athletes without events drop out, as they do after $unwind
+        with_events = events_per > 0
+        athlete_pairs = np.unique(c.noc_owner[with_events].astype(np.int64) * n_nocs + c.noc_codes[with_events])
+        unique_athletes = np.bincount(athlete_pairs % n_nocs, minlength=n_nocs)
+        return [{"noc": c.noc_names[n], "unique_events": int(unique_events[n]),
+                 "unique_athletes": int(unique_athletes[n])}
+                for n in top_k(unique_events, top_n) if unique_events[n]]
+
+
+# ── PARITY AND LATENCY ────────────────────────────────────────────────────
+QUERIES: List[Tuple[str, str, Dict[str, Any]]] = [
+    ("top_athletes", "top_athletes_by_event_count", {"top_n": 20}),
+    ("top_athletes F CHN", "top_athletes_by_event_count", {"top_n": 20, "sex": "F", "noc": "CHN"}),
+    ("top_events", "top_events_by_athlete_count", {"top_n": 20}),
+    ("top_events M USA", "top_events_by_athlete_count", {"top_n": 20, "sex": "M", "noc": "USA"}),
+    ("avg_by_sex", "avg_event_count_by_sex", {}),
+    ("top_nocs", "top_nocs_by_event_diversity", {"top_n": 20}),
+]
+# The value each ranked query sorts on, and the key identifying a row
+RANKED = {
+    "top_athletes_by_event_count": ("athlete_id", "event_count"),
+    "top_events_by_athlete_count": ("event", "unique_athletes"),
+    "top_nocs_by_event_diversity": ("noc", "unique_events"),
+}
+
+
+def same_result(method: str, expected: List[Dict[str, Any]], actual: List[Dict[str, Any]]) -> bool:
+    """
+    Compares results, allowing ties at the cut-off to be broken differently
+    """
+    if method not in RANKED:
+        return expected == actual
+    key, value = RANKED[method]
+    if [r[value] for r in expected] != [r[value] for r in actual]:
+        return False
+    cutoff = expected[-1][value] if expected else None
+    above = lambda rows: {r[key] for r in rows if r[value] != cutoff}
+    by_key = {r[key]: r for r in expected}
+    return above(expected) == above(actual) and all(by_key[r[key]] == r for r in actual if r[key] in by_key)
+
+
+def timed(call: Callable[[], Any], repeat: int) -> Tuple[Any, float]:
+    """
+    Returns the call's result and its best wall time in milliseconds
+    """
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = call()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def compare_backends(db_name: Optional[str] = None, repeat: int = 3) -> List[Dict[str, Any]]:
+    """
+    Runs every query in QUERIES on both backends; returns parity and latency per query
+    """
+    from event_div_api import EventDiversityAPI
+    mongo = EventDiversityAPI(db_name)
+    columns, load_ms = timed(lambda: AthleteColumns.load(mongo.athletes), 1)
+    columnar = ColumnarEventDiversityAPI(db_name, columns=columns)
+
+    report = [{"query": "load columns", "mongo_ms": None, "columnar_ms": round(load_ms, 1), "match": None}]
+    for label, method, kwargs in QUERIES:
+        expected, mongo_ms = timed(lambda: list(getattr(mongo, method)(**kwargs)), repeat)
+        actual, columnar_ms = timed(lambda: getattr(columnar, method)(**kwargs), repeat)
+        report.append({"query": label, "mongo_ms": round(mongo_ms, 1), "columnar_ms": round(columnar_ms, 1),
+                       "match": same_result(method, expected, actual)})
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Check the columnar backend against MongoDB and time both")
+    parser.add_argument("--db", help="database name (default: $MONGODB_DB or olympics)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = compare_backends(args.db, args.repeat)
+    for r in rows:
+        match = "" if r["match"] is None else ("ok" if r["match"] else "MISMATCH")
+        print(f"{r['query']:<22} mongo {r['mongo_ms'] or '-':>8} ms   columnar {r['columnar_ms']:>8} ms   {match}")
+    raise SystemExit(0 if all(r["match"] is not False for r in rows) else 1)
@@ -6,53 +6,460 @@ Amelia converted the CSV files to JSON and then wrote this file to import the da
 olympics.json programmatically.
 Katie & Janet reviewed the code.
 """
-from pymongo import MongoClient
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import argparse
+import bson
 import json
+import os
+import threading
+import time
 
-def main():
+from connection import get_client, get_db
+from indexes import ensure_indexes
+from sketches import build_sketches, update_sketches
+from incidence import build_incidence, update_incidence
+from womens_rep_data_api import refresh_female_rollup
+from china_rise_api import refresh_medal_cube
+from converting_csv.build_cache import file_hash
+from converting_csv.final_conversion import (
+    COLLECTIONS, CollectionBuilder, ndjson_path, iter_ndjson, iter_tsv
+)
 
-    # Create client
-    client = MongoClient()
-    client.drop_database('olympics')
+DEFAULT_INPUT = 'olympics.json'
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_WORKERS = os.cpu_count() or 4
+DEFAULT_RETRIES = 3
+DUPLICATE_KEY = 11000
+# Collection recording which source file hash each collection was last loaded from
+MANIFEST_COLLECTION = 'build_manifest'
+
+# Natural keys the incremental ingest upserts on (the same keys the converter dedups on)
+UPSERT_KEYS = {
+    'athletes': ['athlete_id'],
+    'events': ['event_name'],
+    'games': ['games'],
+    'results': ['athlete_id', 'event', 'games', 'medal'],
+}
+
+
+def batched(docs, size):
+    """
+    Groups an iterable of documents into lists of at most `size` documents
+    """
+    docs = iter(docs)
+    while True:
+        batch = list(islice(docs, size))
+        if not batch:
+            return
+        yield batch
 
-    # Create / connect to database
-    db = client['olympics']
 
-    # Initiate collections
-    events = db.events
-    athletes = db.athletes
-    countries = db.countries
-    games = db.games
-    results = db.results
+def find_ndjson(directory, name):
+    """
+    Returns the NDJSON file for a collection (plain or gzipped), or None if missing
+    """
+    for compress in (False, True):
+        path = ndjson_path(directory, name, compress)
+        if os.path.exists(path):
+            return path
+    return None
 
-    # Load JSON file
-    with open('olympics.json', 'r', encoding='utf-8') as f:
+
+def iter_collections(source, only=None):
+    """
+    Yields (name, documents) for every collection found in `source` (or just those in `only`).
+    A directory is read as one NDJSON file per collection and streamed line by line;
+    a file is read as the single olympics.json document.
+    """
+    names = [name for name in COLLECTIONS if only is None or name in only]
+    if os.path.isdir(source):
+        for name in names:
+            path = find_ndjson(source, name)
+            if path:
+                yield name, iter_ndjson(path)
+        return
+
+    with open(source, 'r', encoding='utf-8') as f:
         data = json.load(f)
+    for name in names:
+        if name in data:
+            yield name, data.pop(name)
+
+
+# ── BUILD CACHE ───────────────────────────────────────────────────────────
+def source_hashes(source):
+    """
+    Returns {collection: hash of the file it is loaded from}. With NDJSON every
+    collection has its own file; olympics.json shares one hash across all of them.
+    """
+    if os.path.isdir(source):
+        hashes = {}
+        for name in COLLECTIONS:
+            path = find_ndjson(source, name)
+            if path:
+                hashes[name] = file_hash(path)
+        return hashes
+    digest = file_hash(source)
+    return {name: digest for name in COLLECTIONS}
+
+
+def stale_collections(db, hashes):
+    """
+    Collections whose source changed since they were loaded, or that are missing from the db
+    """
+    recorded = {doc['_id']: doc.get('source') for doc in db[MANIFEST_COLLECTION].find()}
+    existing = set(db.list_collection_names())
+    return {name for name, digest in hashes.items()
+            if recorded.get(name) != digest or name not in existing}
+
+
+def record_imports(db, hashes, names):
+    for name in names:
+        db[MANIFEST_COLLECTION].replace_one(
+            {'_id': name}, {'_id': name, 'source': hashes[name], 'loaded_at': time.time()}, upsert=True)
+
+
+def forget_imports(db, names):
+    """
+    Marks collections as no longer matching any source file (e.g. after an incremental ingest)
+    """
+    db[MANIFEST_COLLECTION].delete_many({'_id': {'$in': list(names)}})
+
+
+def insert_batch(collection, batch, retries=DEFAULT_RETRIES, backoff=0.5):
+    """
+    Inserts one batch unordered, retrying with exponential backoff on failure.
+
+    insert_many assigns an _id to every document in place, so a retried batch carries
+    the same _ids and any documents that landed on an earlier attempt come back as
+    duplicate key errors, which are safe to ignore.
+    """
+    for attempt in range(retries + 1):
+        try:
+            collection.insert_many(batch, ordered=False)
+            return
+        except BulkWriteError as e:
+            failed = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+            if not failed and not e.details.get("writeConcernErrors"):
+                return
+            if attempt == retries:
+                raise
+        except ConnectionFailure:
+            if attempt == retries:
+                raise
+        print(f"Retrying batch for {collection.name} (attempt {attempt + 2} of {retries + 1})")
+        time.sleep(backoff * 2 ** attempt)
+
+
+def load_collection(collection, docs, batch_pool, batch_size=DEFAULT_BATCH_SIZE,
+                    retries=DEFAULT_RETRIES, max_in_flight=2 * DEFAULT_WORKERS):
+    """
+    Streams one collection into MongoDB by handing fixed-size batches to a shared pool.
+    At most `max_in_flight` batches per collection are queued at once, so memory stays
+    bounded however large the input is.
+
+    Returns a dict with the document count, BSON bytes and seconds taken.
+    """
+    slots = threading.BoundedSemaphore(max_in_flight)
+    futures = []
+    inserted = nbytes = 0
+    start = time.perf_counter()
+
+    for batch in batched(docs, batch_size):
+        nbytes += sum(len(bson.encode(doc)) for doc in batch)
+        slots.acquire()
+        future = batch_pool.submit(insert_batch, collection, batch, retries)
+        future.add_done_callback(lambda _: slots.release())
+        futures.append(future)
+        inserted += len(batch)
+
+    for future in futures:
+        future.result()
+
+    return {"collection": collection.name, "docs": inserted, "bytes": nbytes,
+            "seconds": time.perf_counter() - start}
+
+
+def load_all(db, source, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS,
+             retries=DEFAULT_RETRIES, only=None):
+    """
+    Loads every collection in `source` (or just those in `only`) concurrently. Each collection is read by its own
+    thread while the inserts themselves share one pool of `workers` threads.
+
+    Returns the per-collection stats from load_collection.
+    """
+    stats = []
+    with ThreadPoolExecutor(max_workers=workers) as batch_pool, \
+            ThreadPoolExecutor(max_workers=len(COLLECTIONS)) as readers:
+        futures = [
+            readers.submit(load_collection, db[name], docs, batch_pool,
+                           batch_size, retries, 2 * workers)
+            for name, docs in iter_collections(source, only)
+        ]
+        for future in futures:
+            stats.append(future.result())
+            print_throughput(stats[-1])
+    return stats
+
+
+def print_throughput(stat):
+    seconds = stat["seconds"] or 1e-9
+    print(f"Inserted {stat['collection']}: {stat['docs']} docs in {stat['seconds']:.2f}s "
+          f"({stat['docs'] / seconds:,.0f} docs/sec, "
+          f"{stat['bytes'] / (1024 * 1024) / seconds:,.2f} MB/sec)")
+
+
+def backfill_games_sex(db, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Copies each athlete's sex onto their games.athletes entries for games documents
+    converted before the field existed. Returns the number of games documents updated.
+    """
+    missing = {"athletes": {"$elemMatch": {"sex": {"$exists": False}}}}
+    if db.games.count_documents(missing, limit=1) == 0:
+        return 0
+    sex = {doc["athlete_id"]: doc.get("sex")
+           for doc in db.athletes.find({}, {"_id": 0, "athlete_id": 1, "sex": 1})}
+    updated = 0
+    for batch in batched(db.games.find(missing, {"athletes": 1}), batch_size):
+        ops = [
+            UpdateOne({"_id": g["_id"]}, {"$set": {"athletes": [
+                {"athlete_id": a["athlete_id"], "name": a.get("name"),
+                 "sex": sex.get(a["athlete_id"]), "events": a.get("events", [])}
+                for a in g["athletes"]
+            ]}})
+            for g in batch
+        ]
+        updated += db.games.bulk_write(ops, ordered=False).modified_count
+    return updated
+
+
+def backfill_event_count(db):
+    """
+    Stores event_count on athletes converted before the field existed.
+    Returns the number of athletes updated.
+    """
+    return db.athletes.update_many(
+        {"event_count": {"$exists": False}},
+        [{"$set": {"event_count": {"$size": {"$ifNull": ["$events", []]}}}}],
+    ).modified_count
+
+
+# ── INCREMENTAL INGEST ────────────────────────────────────────────────────
+def merged_set(field, values):
+    """
+    Update-pipeline expression: the stored array unioned with `values`, kept sorted
+    like the converter writes it
+    """
+    return {"$sortArray": {
+        "input": {"$setUnion": [{"$ifNull": [f"${field}", []]}, {"$literal": values}]},
+        "sortBy": 1,
+    }}
 
-    # Insert each collection
-    collections = {
-        'athletes': athletes,
-        'events': events,
-        'countries': countries,
-        'games': games,
-        'results': results,
-        }
 
-    # Load each collection
+def keep_or_set(field, value):
+    """
+    Update-pipeline expression: keep the stored value, falling back to `value`
+    when the field is missing or null
+    """
+    return {"$ifNull": [f"${field}", {"$literal": value}]}
+
+
+def athlete_upsert(a):
+    set_fields = {"nocs", "teams", "events"}
+    return UpdateOne(
+        {"athlete_id": a["athlete_id"]},
+        [
+            {"$set": {
+                field: merged_set(field, value) if field in set_fields else keep_or_set(field, value)
+                for field, value in a.items() if field not in ("athlete_id", "event_count")
+            }},
+            # Recounted from the merged events, so it stays in step with the array
+            {"$set": {"event_count": {"$size": "$events"}}},
+        ],
+        upsert=True,
+    )
+
+
+def event_upsert(e):
+    return UpdateOne(
+        {"event_name": e["event_name"]},
+        [{"$set": {
+            "sport": keep_or_set("sport", e["sport"]),
+            "games_held_in": merged_set("games_held_in", e["games_held_in"]),
+        }}],
+        upsert=True,
+    )
+
+
+def games_upsert(g):
+    # A Games file holds the whole Games, so its document replaces any earlier copy
+    return ReplaceOne({"games": g["games"]}, g, upsert=True)
+
+
+def result_upsert(r):
+    return UpdateOne(
+        {field: r[field] for field in UPSERT_KEYS['results']},
+        {"$setOnInsert": r},
+        upsert=True,
+    )
+
+
+UPSERTS = {
+    'athletes': athlete_upsert,
+    'events': event_upsert,
+    'games': games_upsert,
+    'results': result_upsert,
+}
+
+
+def ingest_tsv(db, tsv_path, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Merges one new Games TSV into an existing database without rebuilding it.
+
+    How it works:
+    - Backfills games.athletes.sex and athletes.event_count on databases converted
+      before they existed
+    - Converts only the new file with the same single-pass builder as the full conversion
+    - Upserts athletes by athlete_id, unioning their nocs, teams and events
+    - Replaces/inserts the games document and adds the Games to events.games_held_in
+    - Inserts results that are new under the (athlete_id, event, games, medal) key
+    - countries is left alone
+    - the female_participation rollup, distinct-count sketches, NOC × event
+      incidence index and medal cube are updated in place
+
+    Work is proportional to the size of the new file, not the whole history.
+    Returns {collection: {"inserted": n, "updated": n}}.
+    """
+    # The unique indexes on the upsert keys make every upsert an index lookup
+    ensure_indexes(db)
+    # A database loaded before games.athletes carried sex would otherwise lose every
+    # earlier year's women when the rollup is rebuilt (no-op once backfilled)
+    backfill_games_sex(db, batch_size)
+    # Likewise athletes.event_count, which top_athletes_by_event_count sorts on
+    backfill_event_count(db)
+    delta = CollectionBuilder().add_all(iter_tsv(tsv_path)).build([])
+
+    summary = {}
+    for name, to_op in UPSERTS.items():
+        inserted = updated = 0
+        for batch in batched(delta[name], batch_size):
+            result = db[name].bulk_write([to_op(doc) for doc in batch], ordered=False)
+            inserted += result.upserted_count
+            updated += result.modified_count
+        summary[name] = {"inserted": inserted, "updated": updated}
+
+    # These collections no longer match the files they were loaded from
+    forget_imports(db, UPSERTS)
+
+    # Only the rollup levels touched by the new Games are recomputed
+    refresh_female_rollup(db, years={g["year"] for g in delta["games"]},
+                          events=[e["event_name"] for e in delta["events"]])
+    # Sketches are mergeable, so the new athletes are folded into the stored ones
+    update_sketches(db, delta["athletes"])
+    update_incidence(db, delta["athletes"])
+    # Only the new Games' medal cube cells are recomputed (the whole cube if it was never built)
+    refresh_medal_cube(db, games=[g["games"] for g in delta["games"]])
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load the converted Olympics data into MongoDB")
+    parser.add_argument('--input', default=DEFAULT_INPUT,
+                        help="olympics.json, or a directory of per-collection NDJSON files")
+    parser.add_argument('--db', help="database name (default: $MONGODB_DB or olympics)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help="documents per insert_many call")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="threads sending batches to the server")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help="times a failed batch is retried before giving up")
+    parser.add_argument('--force', action='store_true',
+                        help="drop and reload everything even if the sources are unchanged")
+    parser.add_argument('--incremental', metavar='TSV',
+                        help="merge one new Games TSV into the existing database instead of reloading")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    # Create client
+    client = get_client()
+
+    if args.incremental:
+        start = time.perf_counter()
+        summary = ingest_tsv(get_db(args.db, client), args.incremental, args.batch_size)
+        for name, counts in summary.items():
+            print(f"{name}: {counts['inserted']} inserted, {counts['updated']} updated")
+        print(f"Ingested {args.incremental} in {time.perf_counter() - start:.2f}s")
+        return
+
+    # Create / connect to database
+    db = get_db(args.db, client)
+
+    # Only reload collections whose source file changed since they were last loaded
+    hashes = source_hashes(args.input)
+    if args.force:
+        client.drop_database(db.name)
+        stale = set(hashes)
+    else:
+        stale = stale_collections(db, hashes)
+        if not stale:
+            print(f"{args.input} is unchanged since the last import; nothing to load")
+            return
+        for name in stale:
+            db.drop_collection(name)
+
+    # Load every changed collection at once, in batches, from a shared worker pool
     # Before, I wrote out "if" statements for each collection. AI helped me streamline this
-    for name, collection in collections.items():
-        if name in data:
-            collection.insert_many(data[name])
-            print(f"Inserted {name}: {len(data[name])}")
+    start = time.perf_counter()
+    stats = load_all(db, args.input, args.batch_size, args.workers, args.retries, only=stale)
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {sum(s['docs'] for s in stats)} documents in {elapsed:.2f}s")
+
+    # Older olympics.json files predate games.athletes.sex, which WomensRepDataAPI filters on
+    if stale & {'games', 'athletes'}:
+        backfilled = backfill_games_sex(db, args.batch_size)
+        if backfilled:
+            print(f"Added athlete sex to {backfilled} games documents")
+
+    # Older olympics.json files predate athletes.event_count, which the event_count indexes cover
+    if 'athletes' in stale:
+        backfilled = backfill_event_count(db)
+        if backfilled:
+            print(f"Added event_count to {backfilled} athletes")
+
+    # Indexes are built after the bulk load, which is cheaper than maintaining them during it
+    for name, created in ensure_indexes(db).items():
+        print(f"Indexed {name}: {', '.join(created)}")
+    record_imports(db, hashes, stale)
+
+    # Rebuild the materialized female participation rollup from the new games
+    if stale & {'games', 'athletes'}:
+        refresh_female_rollup(db)
+        print("Rebuilt female_participation rollup")
+
+    # Rebuild the medal cube behind china_rise_api from the new results
+    if 'results' in stale:
+        refresh_medal_cube(db)
+        print("Rebuilt medal_cube")
+
+    # Rebuild the distinct-count sketches behind EventDiversityAPI's approximate mode
+    if 'athletes' in stale:
+        print(f"Built {build_sketches(db, batch_size=args.batch_size)} distinct-count sketches")
+        print(f"Indexed events for {build_incidence(db, args.batch_size)} NOCs")
 
     # Print collections in DB to verify
     print("\nCollections in DB:")
     print(db.list_collection_names())
 
     # Print a sample document from each collection
-    for name, collection in collections.items():
+    for name in COLLECTIONS:
         print(f"\nSample {name[:-1]}:")
-        print(collection.find_one())
+        print(db[name].find_one())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,156 @@
+"""
+Olympics Analysis Using MongoDB
+
+NOC × event incidence index for EventDiversityAPI.
+    Ranking NOCs by event diversity with $unwind on nocs and events produces one row
+    per athlete × noc × event before anything is grouped. This index keeps, for every
+    NOC, a bitset with bit i set if any of its athletes entered events[i], so distinct
+    event counts, events two NOCs share and the full diversity ranking are answered in
+    memory with popcounts and ANDs. ~765 events fit in under 100 bytes per NOC.
+
+    Stored in the `noc_event_incidence` collection:
+        {noc: None, events: [event names in bit order]}            one header document
+        {noc, bits: bytes, unique_events, unique_athletes}          one per NOC
+
+    New events are appended to the header, so existing bit positions never move.
+"""
+from typing import Dict, Iterable, List, Any, Optional
+from pymongo import ReplaceOne
+
+from connection import clear_collection
+
+INCIDENCE_COLLECTION = "noc_event_incidence"
+
+
+def popcount(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+class IncidenceIndex:
+
+    def __init__(self, events: Optional[List[str]] = None, bits: Optional[Dict[str, int]] = None,
+                 athletes: Optional[Dict[str, int]] = None):
+        self.events: List[str] = list(events or [])
+        self.position: Dict[str, int] = {event: i for i, event in enumerate(self.events)}
+        self.bits: Dict[str, int] = dict(bits or {})
+        self.athletes: Dict[str, int] = dict(athletes or {})
+
+    def __bool__(self) -> bool:
+        return bool(self.bits)
+
+    def event_bit(self, event: str) -> int:
+        if event not in self.position:
+            self.position[event] = len(self.events)
+            self.events.append(event)
+        return 1 << self.position[event]
+
+    def add_athletes(self, athletes: Iterable[Dict[str, Any]], count_athletes: bool = True) -> "IncidenceIndex":
+        """
+        Sets the bits for every athlete's events under each of their NOCs. Athletes
+        without events are skipped, matching the exact pipeline's $unwind.
+        """
+        for a in athletes:
+            events = a.get("events") or []
+            if not events:
+                continue
+            mask = 0
+            for event in events:
+                mask |= self.event_bit(event)
+            for noc in a.get("nocs") or []:
+                self.bits[noc] = self.bits.get(noc, 0) | mask
+                if count_athletes:
+                    self.athletes[noc] = self.athletes.get(noc, 0) + 1
+        return self
+
+    def events_of(self, bits: int) -> List[str]:
+        return sorted(event for event, i in self.position.items() if bits >> i & 1)
+
+    def event_count(self, noc: str) -> int:
+        return popcount(self.bits.get(noc, 0))
+
+    def common_events(self, noc_a: str, noc_b: str) -> List[str]:
+        """
+        Events that athletes of both NOCs have entered
+        """
+        return self.events_of(self.bits.get(noc_a, 0) & self.bits.get(noc_b, 0))
+
+    def ranking(self, top_n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        NOCs by distinct events entered, in top_nocs_by_event_diversity's output shape
+        """
+        rows = [
+            {"noc": noc, "unique_events": popcount(bits), "unique_athletes": self.athletes.get(noc, 0)}
+            for noc, bits in self.bits.items()
+        ]
+        rows.sort(key=lambda r: (-r["unique_events"], r["noc"]))
+        return rows[:top_n] if top_n else rows
+
+    def noc_doc(self, noc: str) -> Dict[str, Any]:
+        bits = self.bits[noc]
+        return {
+            "noc": noc,
+            "bits": bits.to_bytes((bits.bit_length() + 7) // 8, "little"),
+            "unique_events": popcount(bits),
+            "unique_athletes": self.athletes.get(noc, 0),
+        }
+
+    def save(self, db, nocs: Optional[Iterable[str]] = None) -> int:
+        """
+        Writes the header and the given NOCs (all by default). Returns NOC documents written.
+        """
+        collection = db[INCIDENCE_COLLECTION]
+        nocs = list(self.bits if nocs is None else nocs)
+        ops = [ReplaceOne({"noc": None}, {"noc": None, "events": self.events}, upsert=True)]
+        ops += [ReplaceOne({"noc": noc}, self.noc_doc(noc), upsert=True) for noc in nocs]
+        collection.bulk_write(ops, ordered=False)
+        return len(nocs)
+
+    @classmethod
+    def load(cls, db) -> "IncidenceIndex":
+        """
+        Reads the stored index; empty (falsy) if it was never built
+        """
+        return cls.from_docs(db[INCIDENCE_COLLECTION].find({}, {"_id": 0}))
+
+    @classmethod
+    def from_docs(cls, docs: Iterable[Dict[str, Any]]) -> "IncidenceIndex":
+        index = cls()
+        for doc in docs:
+            if doc["noc"] is None:
+                index = cls(doc["events"], index.bits, index.athletes)
+            else:
+                index.bits[doc["noc"]] = int.from_bytes(doc["bits"], "little")
+                index.athletes[doc["noc"]] = doc["unique_athletes"]
+        return index
+
+
+def build_incidence(db, batch_size: int = 1000) -> int:
+    """
+    Rebuilds the incidence index from the athletes collection in one streaming pass.
+    Returns the number of NOCs indexed.
+    """
+    athletes = db.athletes.find({}, {"_id": 0, "nocs": 1, "events": 1}, batch_size=batch_size)
+    index = IncidenceIndex().add_athletes(athletes)
+    clear_collection(db, INCIDENCE_COLLECTION)
+    return index.save(db)
+
+
+def update_incidence(db, athletes: Iterable[Dict[str, Any]]) -> int:
+    """
+    ORs new athlete documents (e.g. an incremental ingest's delta) into the stored
+    index. Athlete counts of the touched NOCs are re-counted from the athletes
+    collection, since returning athletes must not be counted twice.
+    Returns the number of NOCs updated.
+
+    If nothing is stored yet the whole index is built from the athletes collection
+    instead: an index of the delta alone would be trusted over the exact pipeline.
+    """
+    index = IncidenceIndex.load(db)
+    if not index:
+        return build_incidence(db)
+    athletes = [a for a in athletes if a.get("events")]
+    index.add_athletes(athletes, count_athletes=False)
+    touched = sorted({noc for a in athletes for noc in a.get("nocs") or []})
+    for noc in touched:
+        index.athletes[noc] = db.athletes.count_documents({"nocs": noc, "events.0": {"$exists": True}})
+    return index.save(db, touched) if touched else 0
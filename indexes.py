@@ -0,0 +1,213 @@
+"""
+Olympics Analysis Using MongoDB
+
+Index provisioning for the olympics database.
+    Creates the secondary indexes the APIs' $match stages rely on, reports how much
+    space they take, and can check every API query shape with explain() to flag any
+    that still fall back to a full collection scan (COLLSCAN).
+
+    Usage:
+        python indexes.py            # create indexes and print their sizes
+        python indexes.py --check    # also explain each API pipeline and flag COLLSCANs
+"""
+from typing import List, Dict, Any, Optional, Tuple
+from pymongo import IndexModel, ASCENDING, DESCENDING
+import argparse
+
+from connection import get_db
+
+# Indexes per collection, matched to the query shapes each API issues
+INDEXES: Dict[str, List[IndexModel]] = {
+    "athletes": [
+        # Upsert key for incremental ingest
+        IndexModel([("athlete_id", ASCENDING)], unique=True),
+        # EventDiversityAPI.base_pipeline: sex, then optional birth_year range
+        IndexModel([("sex", ASCENDING), ("birth_year", ASCENDING)]),
+        # EventDiversityAPI.base_pipeline: noc (multikey on nocs), then sex / birth_year
+        IndexModel([("nocs", ASCENDING), ("sex", ASCENDING), ("birth_year", ASCENDING)]),
+        # EventDiversityAPI.base_pipeline: birth_year range on its own
+        IndexModel([("birth_year", ASCENDING)]),
+        # EventDiversityAPI.top_athletes_by_event_count: filter and sort from one index walk
+        IndexModel([("event_count", DESCENDING)]),
+        IndexModel([("sex", ASCENDING), ("event_count", DESCENDING)]),
+        IndexModel([("nocs", ASCENDING), ("event_count", DESCENDING)]),
+        IndexModel([("nocs", ASCENDING), ("sex", ASCENDING), ("event_count", DESCENDING)]),
+    ],
+    "events": [
+        IndexModel([("event_name", ASCENDING)], unique=True),
+    ],
+    "countries": [
+        IndexModel([("noc", ASCENDING)]),
+    ],
+    "games": [
+        IndexModel([("games", ASCENDING)], unique=True),
+        # WomensRepDataAPI.base_pipeline: female athletes, optionally by season and/or year
+        IndexModel([("athletes.sex", ASCENDING), ("season", ASCENDING), ("year", ASCENDING)]),
+        IndexModel([("season", ASCENDING), ("year", ASCENDING)]),
+        IndexModel([("year", ASCENDING)]),
+    ],
+    "female_participation": [
+        # WomensRepDataAPI rollup reads: per-year totals, and per-event counts for a slice
+        IndexModel([("event", ASCENDING), ("season", ASCENDING), ("year", ASCENDING)]),
+        IndexModel([("year", ASCENDING), ("season", ASCENDING), ("count", ASCENDING)]),
+    ],
+    "sketches": [
+        # EventDiversityAPI approximate mode loads one kind at a time; upsert key for ingest
+        IndexModel([("kind", ASCENDING), ("key", ASCENDING), ("sex", ASCENDING)], unique=True),
+    ],
+    "medal_cube": [
+        # china_rise_api on the cube: noc with any of sport / season / medal
+        IndexModel([("noc", ASCENDING), ("sport", ASCENDING),
+                    ("season", ASCENDING), ("medal", ASCENDING)]),
+        # get_medal_trends: noc with a year range
+        IndexModel([("noc", ASCENDING), ("year", ASCENDING)]),
+        # medal_leaderboard filters, and per-Games refreshes after an incremental ingest
+        IndexModel([("season", ASCENDING), ("year", ASCENDING)]),
+        IndexModel([("games", ASCENDING)]),
+    ],
+    "noc_event_incidence": [
+        # One header document (noc: None) plus one per NOC
+        IndexModel([("noc", ASCENDING)], unique=True),
+    ],
+    "results": [
+        # Dedup / upsert key shared with the converter
+        IndexModel([("athlete_id", ASCENDING), ("event", ASCENDING),
+                    ("games", ASCENDING), ("medal", ASCENDING)], unique=True),
+        # china_rise_api: noc with any of sport / season / medal
+        IndexModel([("noc", ASCENDING), ("sport", ASCENDING),
+                    ("season", ASCENDING), ("medal", ASCENDING)]),
+        # china_rise_api.get_china_medal_trends: noc with a year range
+        IndexModel([("noc", ASCENDING), ("year", ASCENDING)]),
+        # refresh_medal_cube after an incremental ingest: only the new Games' results
+        IndexModel([("games", ASCENDING)]),
+    ],
+}
+
+
+def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Creates every index in INDEXES (a no-op for ones that already exist).
+
+    Returns:
+        dict mapping collection name to the index names it now has from INDEXES
+    """
+    return {name: db[name].create_indexes(models) for name, models in INDEXES.items()}
+
+
+def index_sizes(db) -> List[Dict[str, Any]]:
+    """
+    Returns the on-disk size of every index in the database, largest first
+    """
+    sizes = []
+    for name in db.list_collection_names():
+        for stats in db[name].aggregate([{"$collStats": {"storageStats": {}}}]):
+            for index, size in stats["storageStats"].get("indexSizes", {}).items():
+                sizes.append({"collection": name, "index": index, "size_kb": round(size / 1024, 1)})
+    return sorted(sizes, key=lambda s: s["size_kb"], reverse=True)
+
+
+def api_query_shapes(db_name: Optional[str] = None) -> List[Tuple[str, str, List[Dict[str, Any]]]]:
+    """
+    Representative filtered pipelines from each API, as (label, collection, pipeline).
+    Only the leading $match matters to the planner, so each pipeline stops there.
+    """
+    # Imported here so creating indexes does not pull in the plotting modules
+    from event_div_api import EventDiversityAPI
+    from womens_rep_data_api import WomensRepDataAPI
+    from china_rise_api import medal_cube_pipeline
+
+    event_div = EventDiversityAPI(db_name)
+    womens_rep = WomensRepDataAPI(db_name)
+
+    shapes = [
+        ("EventDiversityAPI sex", "athletes", event_div.base_pipeline(sex="F")),
+        ("EventDiversityAPI noc", "athletes", event_div.base_pipeline(noc="CHN")),
+        ("EventDiversityAPI sex+noc", "athletes", event_div.base_pipeline(sex="F", noc="CHN")),
+        ("EventDiversityAPI birth_year", "athletes",
+         event_div.base_pipeline(min_birth_year=1980, max_birth_year=1989)),
+        ("EventDiversityAPI top athletes sex", "athletes",
+         event_div.base_pipeline(sex="F") + [{"$sort": {"event_count": -1}}, {"$limit": 20}]),
+        ("EventDiversityAPI top athletes noc", "athletes",
+         event_div.base_pipeline(noc="CHN") + [{"$sort": {"event_count": -1}}, {"$limit": 20}]),
+        ("WomensRepDataAPI females", "games", womens_rep.base_pipeline()[:1]),
+        ("WomensRepDataAPI season", "games", womens_rep.base_pipeline(season="Summer")[:1]),
+        ("WomensRepDataAPI season+year", "games",
+         womens_rep.base_pipeline(season="Summer", year=2020)[:1]),
+        ("china_rise_api noc", "results", [{"$match": {"noc": "CHN"}}]),
+        ("china_rise_api noc+medal+sport", "results",
+         [{"$match": {"noc": "CHN", "medal": "Gold", "sport": "Diving"}}]),
+        ("china_rise_api noc+season", "results", [{"$match": {"noc": "CHN", "season": "Summer"}}]),
+        ("china_rise_api noc+year", "results",
+         [{"$match": {"noc": "CHN", "year": {"$gte": 1984, "$lte": 2020}}}]),
+        ("china_rise_api compare", "results",
+         [{"$match": {"noc": {"$in": ["CHN", "USA", "GBR", "JPN"]}}}]),
+        ("china_rise_api cube noc+sport", "medal_cube", [{"$match": {"noc": "CHN", "sport": "Diving"}}]),
+        ("china_rise_api cube noc+year", "medal_cube",
+         [{"$match": {"noc": "CHN", "year": {"$gte": 1984, "$lte": 2020}}}]),
+        ("china_rise_api cube leaderboard", "medal_cube", [{"$match": {"season": "Summer", "year": 2008}}]),
+        ("china_rise_api cube refresh", "results", medal_cube_pipeline(["2020 Summer Olympics"])[:1]),
+    ]
+    return shapes
+
+
+def plan_stages(plan: Any) -> List[str]:
+    """
+    Collects every stage name in an explain() plan, skipping rejected plans
+    """
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for key, value in plan.items():
+            if key != "rejectedPlans":
+                stages += plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            stages += plan_stages(item)
+    return stages
+
+
+def find_collscans(db) -> List[Dict[str, Any]]:
+    """
+    Explains each API query shape and returns the ones whose winning plan uses COLLSCAN
+    """
+    flagged = []
+    for label, collection, pipeline in api_query_shapes(db.name):
+        explain = db.command(
+            "explain",
+            {"aggregate": collection, "pipeline": pipeline, "cursor": {}},
+            verbosity="queryPlanner",
+        )
+        stages = plan_stages(explain)
+        if "COLLSCAN" in stages:
+            flagged.append({"query": label, "collection": collection, "stages": stages})
+    return flagged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create and check indexes for the olympics database")
+    parser.add_argument("--db", help="database name (default: $MONGODB_DB or olympics)")
+    parser.add_argument("--check", action="store_true",
+                        help="explain every API query shape and flag full collection scans")
+    args = parser.parse_args(argv)
+
+    db = get_db(args.db)
+
+    for name, created in ensure_indexes(db).items():
+        print(f"{name}: {', '.join(created)}")
+
+    print("\nIndex sizes:")
+    for s in index_sizes(db):
+        print(f"  {s['collection']}.{s['index']}: {s['size_kb']} KB")
+
+    if args.check:
+        flagged = find_collscans(db)
+        print(f"\n{len(flagged)} API pipeline(s) doing a COLLSCAN")
+        for f in flagged:
+            print(f"  {f['query']} on {f['collection']}: {' → '.join(f['stages'])}")
+        return 1 if flagged else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
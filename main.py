@@ -7,20 +7,23 @@ Katie wrote the code to implement the API she wrote on EventDiversityAPI
 Janet wrote the code to implement the API she wrote on ChinaRiseAPI
 
 """
+from connection import get_client
 from womens_rep_data_api import WomensRepDataAPI
 from womens_rep_plot_api import WomensRepPlotAPI
 from event_div_api import EventDiversityAPI
 from china_rise_api import (
-    get_china_medals,
+    get_china_medals_batch,
     get_china_top_sports,
     get_china_medal_trends,
     compare_china_vs
 )
 from china_visualization import plot_china_sport_breakdown
 
-event_div = EventDiversityAPI()
-womens_rep_data = WomensRepDataAPI()
-womens_rep_plot = WomensRepPlotAPI()
+# One connection pool for the whole process; nothing connects until the first query
+client = get_client()
+event_div = EventDiversityAPI(client=client)
+womens_rep_data = WomensRepDataAPI(client=client)
+womens_rep_plot = WomensRepPlotAPI(data=womens_rep_data)
 
 
 # AI suggested using tabulate to make the outputs more readable
@@ -63,7 +66,8 @@ def main():
 
     # Display data to explore China's rise as an Olympic superpower
     print("\n=== China Overall Medal Summary ===")
-    result = get_china_medals()
+    # Both China summaries come back from one aggregation
+    result, diving_result = get_china_medals_batch([{}, {"medal_type": "Gold", "sport": "Diving"}])
     summary_data = [{"Total Medals": result["total_medals"], **result["breakdown"]}]
     print(tabulate(summary_data, headers="keys", tablefmt="pretty"))
 
@@ -71,7 +75,6 @@ def main():
     print(tabulate(result["top_events"], headers="keys", tablefmt="pretty"))
 
     print("\nChina's Gold Medals in Diving:")
-    diving_result = get_china_medals(medal_type="Gold", sport="Diving")
     print(f"Total: {diving_result['total_medals']}")
     print(tabulate(diving_result["top_events"], headers="keys", tablefmt="pretty"))
 
@@ -0,0 +1,197 @@
+"""
+Olympics Analysis Using MongoDB
+
+HyperLogLog distinct-count sketches for EventDiversityAPI's approximate mode.
+    Counting unique athletes per event (or unique events per NOC) exactly means
+    holding every distinct value of every group at once. A HyperLogLog sketch keeps a
+    fixed 2^p byte registers per group instead, and two sketches of the same group
+    merge by taking the register-wise max, so per-sex sketches combine into an
+    all-athletes count and new Games can be folded into stored sketches.
+
+    Sketches stored in the `sketches` collection, one document per group:
+        kind "event_athletes"  key = event,  sex = "M" / "F"   athlete_ids
+        kind "noc_athletes"    key = noc,    sex = None        athlete_ids
+        kind "noc_events"      key = noc,    sex = None        event names
+
+    With the default precision p = 12 (4096 registers, 4 KB per sketch) the relative
+    standard error is 1.04 / sqrt(4096) ≈ 1.6%, so about 95% of estimates land within
+    ±3.3% of the exact count. Small counts use linear counting and are close to exact.
+"""
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+from hashlib import blake2b
+from pymongo import ReplaceOne
+import math
+
+from connection import clear_collection
+
+SKETCH_COLLECTION = "sketches"
+PRECISION = 12
+KINDS = ("event_athletes", "noc_athletes", "noc_events")
+# 2^-rank for every possible register value, so estimates avoid repeated pow() calls
+_INVERSE_POWERS = [2.0 ** -r for r in range(65)]
+
+
+def relative_error(p: int = PRECISION) -> float:
+    """
+    Relative standard error of a HyperLogLog estimate with 2^p registers
+    """
+    return 1.04 / math.sqrt(1 << p)
+
+
+class HyperLogLog:
+    __slots__ = ("p", "registers")
+
+    def __init__(self, p: int = PRECISION, registers: Optional[bytes] = None):
+        self.p = p
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << p)
+
+    @staticmethod
+    def position(value: Any, p: int = PRECISION) -> Tuple[int, int]:
+        """
+        Hashes a value to (register index, rank). Computing this once per value lets
+        the same value be added to many sketches cheaply.
+        """
+        x = int.from_bytes(blake2b(str(value).encode("utf-8"), digest_size=8).digest(), "big")
+        bits = 64 - p
+        rest = x & ((1 << bits) - 1)
+        # Rank = position of the first 1 bit in the remaining bits
+        return x >> bits, bits - rest.bit_length() + 1
+
+    def add(self, value: Any) -> None:
+        self.add_position(*self.position(value, self.p))
+
+    def add_position(self, index: int, rank: int) -> None:
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """
+        Folds another sketch of the same precision into this one (set union)
+        """
+        if other.p != self.p:
+            raise ValueError(f"Cannot merge sketches of precision {self.p} and {other.p}")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        """
+        Estimated number of distinct values added
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(_INVERSE_POWERS[r] for r in self.registers)
+        zeros = self.registers.count(0)
+        # Small-range correction: linear counting is more accurate while registers are empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    @property
+    def error(self) -> float:
+        return relative_error(self.p)
+
+
+def athlete_sketches(athletes: Iterable[Dict[str, Any]], p: int = PRECISION) -> Dict[Tuple, HyperLogLog]:
+    """
+    Builds every sketch from athlete documents ({athlete_id, sex, nocs, events}).
+    Returns {(kind, key, sex): HyperLogLog}.
+
+    Each athlete_id and event name is hashed once, however many sketches it goes into.
+    Athletes without events are skipped, matching the exact pipelines' $unwind.
+    """
+    sketches: Dict[Tuple, HyperLogLog] = {}
+    event_positions: Dict[str, Tuple[int, int]] = {}
+
+    def add(key, position):
+        sketch = sketches.get(key)
+        if sketch is None:
+            sketch = sketches[key] = HyperLogLog(p)
+        sketch.add_position(*position)
+
+    for a in athletes:
+        events = a.get("events") or []
+        if not events:
+            continue
+        athlete = HyperLogLog.position(a["athlete_id"], p)
+        for event in events:
+            add(("event_athletes", event, a.get("sex")), athlete)
+            if event not in event_positions:
+                event_positions[event] = HyperLogLog.position(event, p)
+        for noc in a.get("nocs") or []:
+            add(("noc_athletes", noc, None), athlete)
+            for event in events:
+                add(("noc_events", noc, None), event_positions[event])
+    return sketches
+
+
+def sketch_doc(key: Tuple, sketch: HyperLogLog) -> Dict[str, Any]:
+    kind, group, sex = key
+    return {"kind": kind, "key": group, "sex": sex, "p": sketch.p, "registers": bytes(sketch.registers)}
+
+
+def build_sketches(db, p: int = PRECISION, batch_size: int = 1000) -> int:
+    """
+    Rebuilds the sketches collection from the athletes collection in one streaming pass.
+    Returns the number of sketches written.
+    """
+    athletes = db.athletes.find({}, {"_id": 0, "athlete_id": 1, "sex": 1, "nocs": 1, "events": 1},
+                                batch_size=batch_size)
+    docs = [sketch_doc(key, sketch) for key, sketch in athlete_sketches(athletes, p).items()]
+    clear_collection(db, SKETCH_COLLECTION)
+    for i in range(0, len(docs), batch_size):
+        db[SKETCH_COLLECTION].insert_many(docs[i:i + batch_size], ordered=False)
+    return len(docs)
+
+
+def update_sketches(db, athletes: Iterable[Dict[str, Any]], p: int = PRECISION) -> int:
+    """
+    Merges new athlete documents (e.g. an incremental ingest's delta) into the stored
+    sketches. Adding an athlete twice is harmless, so only the delta needs hashing.
+    Returns the number of sketches written.
+
+    With no sketches stored yet, all of them are built from the athletes collection
+    instead, so approximate mode never reads sketches of the delta alone.
+    """
+    collection = db[SKETCH_COLLECTION]
+    if collection.find_one({}, {"_id": 1}) is None:
+        return build_sketches(db, p)
+    delta = athlete_sketches(athletes, p)
+    ops = []
+    for key, sketch in delta.items():
+        kind, group, sex = key
+        stored = collection.find_one({"kind": kind, "key": group, "sex": sex})
+        if stored is not None:
+            sketch.merge(HyperLogLog(stored["p"], stored["registers"]))
+        ops.append(ReplaceOne({"kind": kind, "key": group, "sex": sex}, sketch_doc(key, sketch), upsert=True))
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def load_sketches(db, kind: str) -> Dict[Tuple[Any, Optional[str]], HyperLogLog]:
+    """
+    Returns {(key, sex): HyperLogLog} for one kind of sketch
+    """
+    return sketches_from_docs(db[SKETCH_COLLECTION].find({"kind": kind}, {"_id": 0}))
+
+
+def sketches_from_docs(docs: Iterable[Dict[str, Any]]) -> Dict[Tuple[Any, Optional[str]], HyperLogLog]:
+    return {(doc["key"], doc["sex"]): HyperLogLog(doc["p"], doc["registers"]) for doc in docs}
+
+
+def ranked_estimates(sketches: Dict[Tuple[Any, Optional[str]], HyperLogLog],
+                     sex: Optional[str] = None) -> List[Tuple[Any, int]]:
+    """
+    Merges the sketches per key (across sexes unless `sex` is given) and returns
+    (key, estimate) pairs, largest first
+    """
+    merged: Dict[Any, HyperLogLog] = {}
+    for (key, sketch_sex), sketch in sketches.items():
+        if sex is not None and sketch_sex != sex:
+            continue
+        if key in merged:
+            merged[key] = HyperLogLog(sketch.p, merged[key].registers).merge(sketch)
+        else:
+            merged[key] = sketch
+    return sorted(((key, sketch.count()) for key, sketch in merged.items()),
+                  key=lambda item: item[1], reverse=True)
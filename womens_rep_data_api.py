@@ -10,19 +10,156 @@ Women's Representation API:
     3. What events see the greatest number of female athletes overall? What events see the lowest?
     4. What events have seen the most growth in female athletes?
 """
-from pymongo import MongoClient
+from connection import get_client, get_db, clear_collection
+
+# Materialized rollup of distinct female athlete counts keyed by (year, season, event)
+ROLLUP = "female_participation"
+
+# Levels of the rollup: the keys each level groups by. A key left out is stored as null,
+# meaning "all years / both seasons / all events", since distinct athlete counts cannot
+# be summed across years or events after the fact
+ROLLUP_LEVELS = [
+    ("year", "season", "event"),   # female_athletes_events(season, year)
+    ("year", "event"),             # female_athletes_events(year=...), female_athlete_event_growth
+    ("year", "season"),            # female_athletes_year(season)
+    ("year",),                     # female_athletes_year()
+    ("season", "event"),           # female_athletes_events(season=...)
+    ("event",),                    # female_athletes_events()
+]
+
+
+def female_base_pipeline(season=None, year=None):
+    """
+    Shared pipeline: match games with female athletes → keep only the fields we use →
+    unwind athletes → filter to females
+    Sex is stored on every games.athletes entry, so the filter runs on the server (and can
+    use the athletes.sex index) instead of shipping every female athlete_id in an $in list
+    """
+    match = {"athletes.sex": "F"}
+
+    # Filtering by the seasons and years
+    if season:
+        match["season"] = season
+    if year:
+        match["year"] = year
+    # Using unwind so that every document represents one female athlete in
+    # one event in one game
+    return [
+        {"$match": match},
+        # Drop medal_results etc. so they are not copied into every unwound document
+        {"$project": {"_id": 0, "year": 1, "season": 1, "athletes": 1}},
+        {"$unwind": "$athletes"},
+        {"$match": {"athletes.sex": "F"}},
+    ]
+
+
+def rollup_pipeline(level, year=None, events=None):
+    """
+    Pipeline that counts distinct female athletes for one rollup level and $merges the
+    counts into the rollup, optionally only for one year or a set of events
+    """
+    pipeline = female_base_pipeline(year=year)
+    if "event" in level:
+        pipeline.append({"$unwind": "$athletes.events"})
+        if events is not None:
+            pipeline.append({"$match": {"athletes.events": {"$in": list(events)}}})
+
+    fields = {"year": "$year", "season": "$season", "event": "$athletes.events"}
+    key = {field: fields[field] for field in level}
+    return pipeline + [
+        # So that we are not counting athletes twice
+        {"$group": {"_id": {**key, "athlete_id": "$athletes.athlete_id"}}},
+        {"$group": {
+            "_id": {field: f"$_id.{field}" if field in level else None for field in fields},
+            "count": {"$sum": 1},
+        }},
+        {"$set": {"year": "$_id.year", "season": "$_id.season", "event": "$_id.event"}},
+        {"$merge": {"into": ROLLUP, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+def refresh_female_rollup(db, years=None, events=None):
+    """
+    Builds the female_participation rollup from the games collection with $merge.
+
+    With no arguments the rollup is rebuilt from scratch (after a full import). After an
+    incremental load, pass the years and events of the new Games: only the levels for those
+    years are recomputed, plus the all-years levels for those events. An empty rollup is
+    always rebuilt in full, since rollup_ready() would otherwise trust one holding only
+    the new years.
+    """
+    rollup = db[ROLLUP]
+    if years is None or rollup.find_one({}, {"_id": 1}) is None:
+        clear_collection(db, ROLLUP)
+        for level in ROLLUP_LEVELS:
+            db.games.aggregate(rollup_pipeline(level))
+        return
+
+    year_levels = [level for level in ROLLUP_LEVELS if "year" in level]
+    for year in years:
+        rollup.delete_many({"year": year})
+        for level in year_levels:
+            db.games.aggregate(rollup_pipeline(level, year=year))
+    for level in ROLLUP_LEVELS:
+        if level not in year_levels:
+            db.games.aggregate(rollup_pipeline(level, events=events))
+
 
 class WomensRepDataAPI:
 
-    def __init__(self, db_name="olympics"):
-        client = MongoClient()
-        self.db = client[db_name]
+    def __init__(self, db_name=None, use_rollup=True, stream=False, batch_size=None, client=None):
+        # One shared connection pool per process unless a client is passed in
+        client = client if client is not None else get_client()
+        # db_name defaults to MONGODB_DB (see connection.get_db), like china_rise_api
+        self.db = get_db(db_name, client)
         self.games = self.db.games
         self.athletes = self.db.athletes
+        self.rollup = self.db[ROLLUP]
+        # Read from the rollup when it has been built, otherwise aggregate games directly
+        self.use_rollup = use_rollup
+        self._rollup_ready = None
+        # Growth results per window, see cached()
+        self._growth_cache = {}
+        # stream=True returns lazily consumed cursors instead of lists, fetched batch_size at a time
+        self.stream = stream
+        self.batch_size = batch_size
+
+    def rollup_ready(self):
+        """
+        True if reads should come from the female_participation rollup (checked once)
+        """
+        if self._rollup_ready is None:
+            self._rollup_ready = self.use_rollup and self.rollup.find_one({}, {"_id": 1}) is not None
+        return self._rollup_ready
+
+    def refresh_rollup(self, years=None, events=None):
+        refresh_female_rollup(self.db, years, events)
+        self._rollup_ready = None
+        self._growth_cache.clear()
+
+    def aggregate(self, collection, pipeline):
+        if self.batch_size:
+            return collection.aggregate(pipeline, batchSize=self.batch_size)
+        return collection.aggregate(pipeline)
+
+    def find(self, collection, query, projection):
+        cursor = collection.find(query, projection)
+        if self.batch_size:
+            cursor = cursor.batch_size(self.batch_size)
+        return cursor
+
+    def rows(self, cursor, fields):
+        """
+        Reshapes each document to `fields` (in that order). Returns a generator over the
+        cursor in stream mode, otherwise a list.
+        """
+        rows = ({field: d[field] for field in fields} for d in cursor)
+        return rows if self.stream else list(rows)
 
     def female_athlete_ids(self):
         """
         Returns a set of all female athlete_ids from the athletes collection
+        (no longer needed by base_pipeline, which filters on games.athletes.sex)
         """
         return {
             doc["athlete_id"]
@@ -33,70 +170,179 @@ class WomensRepDataAPI:
         """
         I was struggling writing this code to be more concise. AI suggested I use a base_pipeline
         function since most of my functions start with the same steps.
-        Shared pipeline: optional match → unwind athletes → filter to females
+        See female_base_pipeline
         """
-        female_ids = self.female_athlete_ids()
-        match = {}
+        return female_base_pipeline(season=season, year=year)
 
-        # Filtering by the seasons and years
-        if season:
-            match["season"] = season
-        if year:
-            match["year"] = year
-        pipeline = []
-        if match:
-            pipeline.append({"$match": match})
-        # Using unwind so that every document represents one female athlete in
-        # one event in one game
-        pipeline += [
-            {"$unwind": "$athletes"},
-            {"$match": {"athletes.athlete_id": {"$in": list(female_ids)}}},
-        ]
-        return pipeline
-
-    def female_athletes_year(self, season=None):
+    @staticmethod
+    def year_count_stages():
         """
-        Returns the total number of unique female athletes per year
+        Stages turning unwound female athletes into unique athletes per year
         """
-        pipeline = self.base_pipeline(season=season) + [
+        return [
             {"$group": {"_id": {"year": "$year", "athlete_id": "$athletes.athlete_id"}}},
             {"$group": {"_id": "$_id.year", "count": {"$sum": 1}}},
             {"$sort": {"_id": 1}},
             {"$project": {"_id": 0, "year": "$_id", "count": 1}},
         ]
-        results = list(self.games.aggregate(pipeline))
-        # Make sure the order is year, count
-        return [{"year": d["year"], "count": d["count"]} for d in results]
 
-    def female_athletes_events(self, season=None, year=None, top_n=None, bottom_n=None):
+    @staticmethod
+    def event_count_stages(limit=None, ascending=False):
         """
-        Returns total unique female athletes per event across all years
+        Stages turning unwound female athletes into unique athletes per event, largest first
+        (smallest first with ascending=True), optionally keeping only `limit` events
         """
-        pipeline = self.base_pipeline(season=season, year=year) + [
+        stages = [
             {"$unwind": "$athletes.events"},
             {"$group": {"_id": {"event": "$athletes.events", "athlete_id": "$athletes.athlete_id"}}},
             {"$group": {"_id": "$_id.event", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$project": {"_id": 0, "event": "$_id", "count": 1}},
+            # $sort followed by $limit keeps only the top/bottom N in memory on the server
+            {"$sort": {"count": 1 if ascending else -1}},
         ]
-        # Make sure the order is event, count
-        results = [{"event": d["event"], "count": d["count"]} for d in self.games.aggregate(pipeline)]
+        if limit:
+            stages.append({"$limit": limit})
+        stages.append({"$project": {"_id": 0, "event": "$_id", "count": 1}})
+        return stages
+
+    @staticmethod
+    def slice_filter(season=None, year=None):
+        match = {}
+        if season:
+            match["season"] = season
+        if year:
+            match["year"] = year
+        return match
+
+    def female_athletes_year(self, season=None):
+        """
+        Returns the total number of unique female athletes per year
+        """
+        if self.rollup_ready():
+            results = self.find(
+                self.rollup,
+                {"event": None, "season": season, "year": {"$ne": None}},
+                {"_id": 0, "year": 1, "count": 1},
+            ).sort("year", 1)
+        else:
+            results = self.aggregate(self.games, self.base_pipeline(season=season) + self.year_count_stages())
+        # Make sure the order is year, count
+        return self.rows(results, ("year", "count"))
 
-        if top_n:
-            return results[:top_n]
+    def female_athletes_year_batch(self, seasons):
+        """
+        Returns female_athletes_year for several seasons (None = both) from one aggregation.
+
+        How it works:
+        - One shared $match (and, without the rollup, one shared unwind of female athletes)
+        - A $facet branch per season that groups the shared documents for that season
+        - Results come back in one document, so the whole batch is a single round trip
+
+        Returns:
+            list with one female_athletes_year result per season, in the same order
+        """
+        seasons = list(seasons)
+        if self.rollup_ready():
+            collection = self.rollup
+            shared = [{"$match": {"event": None, "year": {"$ne": None}, "season": {"$in": seasons}}}]
+            facets = {
+                f"s{i}": [{"$match": {"season": season}}, {"$sort": {"year": 1}},
+                          {"$project": {"_id": 0, "year": 1, "count": 1}}]
+                for i, season in enumerate(seasons)
+            }
+        else:
+            collection = self.games
+            shared = self.base_pipeline()
+            if None not in seasons:
+                shared = [{"$match": {"season": {"$in": seasons}}}] + shared
+            facets = {
+                f"s{i}": [{"$match": self.slice_filter(season)}] + self.year_count_stages()
+                for i, season in enumerate(seasons)
+            }
+        doc = next(collection.aggregate(shared + [{"$facet": facets}]))
+        return [[{"year": d["year"], "count": d["count"]} for d in doc[f"s{i}"]]
+                for i in range(len(seasons))]
+
+    def female_athletes_events(self, season=None, year=None, top_n=None, bottom_n=None):
+        """
+        Returns total unique female athletes per event across all years, largest first.
+        top_n / bottom_n are applied on the server with $sort + $limit (ascending for
+        bottom_n), so only those events are sent back.
+        """
+        limit = top_n or bottom_n
         # I chose not to visualize the bottom_n but left this code to display that it could be easily done
-        if bottom_n:
-            return results[-bottom_n:]
+        ascending = bool(bottom_n and not top_n)
+        if self.rollup_ready():
+            cursor = self.find(
+                self.rollup,
+                {"year": year or None, "season": season or None, "event": {"$ne": None}},
+                {"_id": 0, "event": 1, "count": 1},
+            ).sort("count", 1 if ascending else -1)
+            if limit:
+                cursor = cursor.limit(limit)
+        else:
+            cursor = self.aggregate(
+                self.games,
+                self.base_pipeline(season=season, year=year) + self.event_count_stages(limit, ascending),
+            )
+        # Make sure the order is event, count
+        results = self.rows(cursor, ("event", "count"))
+        if ascending:
+            # Bottom N still reads largest first, like the tail of the full list
+            return list(reversed(list(results)))
         return results
 
-    def female_athlete_event_growth(self, top_n=None):
+    def female_athletes_events_batch(self, slices, top_n=None):
         """
-        Returns events with the largest increase in female athletes from that events
-        first Olympic appearance to most recent
-        AI was super helpful in helping me to brainstorm how to go about this pipeline,
-        fixing my syntax, and debugging
+        Returns female_athletes_events for several (season, year) slices from one aggregation.
+
+        How it works:
+        - A shared $match on the union of the slices (and, without the rollup, one shared
+          unwind of female athletes and their events)
+        - A $facet branch per slice that counts, sorts and (with top_n) limits on the server
+
+        Parameters:
+            slices: list of (season, year) tuples; None in either means "all"
+            top_n: optional number of events to keep per slice
+
+        Returns:
+            list with one female_athletes_events result per slice, in the same order
+        """
+        slices = [tuple(s) for s in slices]
+        limit = [{"$limit": top_n}] if top_n else []
+        if self.rollup_ready():
+            collection = self.rollup
+            keys = [{"season": season or None, "year": year or None} for season, year in slices]
+            shared = [{"$match": {"event": {"$ne": None}, "$or": keys}}]
+            facets = {
+                f"s{i}": [{"$match": key}, {"$sort": {"count": -1}}] + limit +
+                         [{"$project": {"_id": 0, "event": 1, "count": 1}}]
+                for i, key in enumerate(keys)
+            }
+        else:
+            collection = self.games
+            filters = [self.slice_filter(season, year) for season, year in slices]
+            shared = self.base_pipeline()
+            if all(filters):
+                shared = [{"$match": {"$or": filters}}] + shared
+            facets = {
+                f"s{i}": [{"$match": match}] + self.event_count_stages(top_n)
+                for i, match in enumerate(filters)
+            }
+        doc = next(collection.aggregate(shared + [{"$facet": facets}]))
+        return [[{"event": d["event"], "count": d["count"]} for d in doc[f"s{i}"]]
+                for i in range(len(slices))]
+
+    def yearly_event_counts_pipeline(self):
         """
-        pipeline = self.base_pipeline() + [
+        Pipeline producing one {_id: {event, year}, count} document per event per year,
+        read from the rollup when available
+        """
+        if self.rollup_ready():
+            return self.rollup, [
+                {"$match": {"season": None, "year": {"$ne": None}, "event": {"$ne": None}}},
+                {"$project": {"_id": {"event": "$event", "year": "$year"}, "count": 1}},
+            ]
+        return self.games, self.base_pipeline() + [
             {"$unwind": "$athletes.events"},
             # So that we are not counting athletes twice
             {"$group": {
@@ -107,32 +353,136 @@ class WomensRepDataAPI:
                 "_id": {"event": "$_id.event", "year": "$_id.year"},
                 "count": {"$sum": 1}
             }},
-            # Collects all the yearly counts into an array (yearly_counts)
-            {"$group": {
-                "_id": "$_id.event",
-                "yearly_counts": {"$push": {"year": "$_id.year", "count": "$count"}}
-            }},
-            # Sorts yearly_counts by year and takes first and last entries
-            {"$project": {
-                "event": "$_id",
-                "first": {"$first": {"$sortArray": {"input": "$yearly_counts", "sortBy": {"year": 1}}}},
-                "last": {"$last": {"$sortArray": {"input": "$yearly_counts", "sortBy": {"year": 1}}}},
+        ]
+
+    @staticmethod
+    def growth_window_stages(rolling=3, from_year=None, to_year=None):
+        """
+        Window stages over {_id: {event, year}, count} documents, one pass per event.
+
+        How it works:
+        - $setWindowFields partitions by event and sorts each partition by year
+        - first/last over the whole partition give the first and most recent appearance
+        - $shift gives the previous Games' count, for Games-over-Games deltas
+        - a sliding window of `rolling` Games gives the rolling average
+        - with from_year / to_year, the counts at those two Games are picked out of the
+          partition as well (0 if the event was not held that year)
+
+        Returns:
+            stages producing one document per event per year with the fields above
+        """
+        whole = {"documents": ["unbounded", "unbounded"]}
+        output = {
+            "first_year": {"$first": "$_id.year", "window": whole},
+            "first_count": {"$first": "$count", "window": whole},
+            "last_year": {"$last": "$_id.year", "window": whole},
+            "last_count": {"$last": "$count", "window": whole},
+            "previous_count": {"$shift": {"output": "$count", "by": -1, "default": None}},
+            "rolling_avg": {"$avg": "$count", "window": {"documents": [1 - rolling, 0]}},
+        }
+        for field, year in (("from_count", from_year), ("to_count", to_year)):
+            if year is not None:
+                # $max skips the nulls, leaving the count for that one year (or null)
+                output[field] = {
+                    "$max": {"$cond": [{"$eq": ["$_id.year", year]}, "$count", None]},
+                    "window": whole,
+                }
+        return [
+            {"$setWindowFields": {
+                "partitionBy": "$_id.event",
+                "sortBy": {"_id.year": 1},
+                "output": output,
             }},
-            # Displaying data and computing growth
-            {"$project": {
-                "_id": 0,
-                "event": 1,
-                "first_year": "$first.year",
-                "last_year": "$last.year",
-                "first_count": "$first.count",
-                "last_count": "$last.count",
-                "growth": {"$subtract": ["$last.count", "$first.count"]},
+            {"$addFields": {
+                "delta": {"$subtract": ["$count", "$previous_count"]},
+                "rolling_avg": {"$round": ["$rolling_avg", 2]},
             }},
-            # At first, I was going to take a growth percentage. However, the percentages ended up being
-            # so large that it was too difficult to interpret. Therefore, I decided to keep the raw
-            # increase in number of female athletes
-            {"$sort": {"growth": -1}},
         ]
-        if top_n:
-            pipeline.append({"$limit": top_n})
-        return list(self.games.aggregate(pipeline))
\ No newline at end of file
+
+    def cached(self, key, compute):
+        """
+        Returns the cached result for a growth window, computing it on first use.
+        Cleared when the rollup is refreshed.
+        """
+        if key not in self._growth_cache:
+            self._growth_cache[key] = list(compute())
+        result = self._growth_cache[key]
+        return iter(result) if self.stream else list(result)
+
+    def female_event_timeline(self, events=None, rolling=3):
+        """
+        Returns every event's female participation per year with Games-over-Games delta,
+        rolling average over `rolling` Games, and the event's first/last appearance.
+
+        Parameters:
+            events: optional list of events to keep
+            rolling: number of Games in the rolling average window
+        """
+        def compute():
+            collection, pipeline = self.yearly_event_counts_pipeline()
+            if events:
+                pipeline = pipeline + [{"$match": {"_id.event": {"$in": list(events)}}}]
+            pipeline = pipeline + self.growth_window_stages(rolling) + [
+                {"$project": {
+                    "_id": 0,
+                    "event": "$_id.event",
+                    "year": "$_id.year",
+                    "count": 1,
+                    "delta": 1,
+                    "rolling_avg": 1,
+                    "first_year": 1,
+                    "last_year": 1,
+                }},
+                {"$sort": {"event": 1, "year": 1}},
+            ]
+            return self.aggregate(collection, pipeline)
+
+        key = ("timeline", tuple(sorted(events)) if events else None, rolling)
+        return self.cached(key, compute)
+
+    def female_athlete_event_growth(self, top_n=None, from_year=None, to_year=None):
+        """
+        Returns events with the largest increase in female athletes from that events
+        first Olympic appearance to most recent
+        AI was super helpful in helping me to brainstorm how to go about this pipeline,
+        fixing my syntax, and debugging
+
+        With from_year and to_year, compares those two Games instead (an event missing
+        from either counts as 0 there). first/last come from window functions over each
+        event's years, so no per-event arrays are built or sorted.
+        """
+        between = from_year is not None and to_year is not None
+
+        def compute():
+            collection, pipeline = self.yearly_event_counts_pipeline()
+            if between:
+                # Only the two chosen Games matter
+                pipeline = pipeline + [{"$match": {"_id.year": {"$in": [from_year, to_year]}}}]
+                first = {"year": from_year, "count": {"$ifNull": ["$from_count", 0]}}
+                last = {"year": to_year, "count": {"$ifNull": ["$to_count", 0]}}
+            else:
+                first = {"year": "$first_year", "count": "$first_count"}
+                last = {"year": "$last_year", "count": "$last_count"}
+            pipeline = pipeline + self.growth_window_stages(from_year=from_year, to_year=to_year) + [
+                # Every row of an event carries the same window values, so keep one per event
+                {"$match": {"$expr": {"$eq": ["$_id.year", "$last_year"]}}},
+                # Displaying data and computing growth
+                {"$project": {
+                    "_id": 0,
+                    "event": "$_id.event",
+                    "first_year": {"$literal": first["year"]} if between else first["year"],
+                    "last_year": {"$literal": last["year"]} if between else last["year"],
+                    "first_count": first["count"],
+                    "last_count": last["count"],
+                    "growth": {"$subtract": [last["count"], first["count"]]},
+                }},
+                # At first, I was going to take a growth percentage. However, the percentages ended up being
+                # so large that it was too difficult to interpret. Therefore, I decided to keep the raw
+                # increase in number of female athletes
+                {"$sort": {"growth": -1}},
+            ]
+            if top_n:
+                pipeline.append({"$limit": top_n})
+            return self.aggregate(collection, pipeline)
+
+        return self.cached(("growth", top_n, from_year, to_year), compute)
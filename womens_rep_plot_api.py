@@ -10,8 +10,9 @@ import matplotlib.pyplot as plt
 
 class WomensRepPlotAPI:
 
-    def __init__(self, db_name="olympics"):
-        self.data = WomensRepDataAPI(db_name)
+    def __init__(self, db_name=None, client=None, data=None):
+        # Reuse an existing data API (and its connection) when one is given
+        self.data = data if data is not None else WomensRepDataAPI(db_name, client=client)
 
     def plot_female_athletes_year(self):
         """
@@ -31,8 +32,8 @@ class WomensRepPlotAPI:
         """
         Line graph comparing female athletes in Summer vs. Winter Olympics
         """
-        summer = self.data.female_athletes_year(season="Summer")
-        winter = self.data.female_athletes_year(season="Winter")
+        # Both seasons come back from a single aggregation
+        summer, winter = self.data.female_athletes_year_batch(["Summer", "Winter"])
 
         plt.figure(figsize=(12, 5))
         plt.plot([d["year"] for d in summer], [d["count"] for d in summer],
@@ -56,10 +57,9 @@ class WomensRepPlotAPI:
         3. Top 10 events with greatest number of female athletes in the
             most recent Winter Olympics (Beijing 2022)
         """
-        # Define 3 bar charts
-        overall = self.data.female_athletes_events(top_n=top_n)
-        summer_20 = self.data.female_athletes_events(season="Summer", year=2020, top_n=top_n)
-        winter_22 = self.data.female_athletes_events(season="Winter", year=2022, top_n=top_n)
+        # Define 3 bar charts, fetched together in one aggregation
+        overall, summer_20, winter_22 = self.data.female_athletes_events_batch(
+            [(None, None), ("Summer", 2020), ("Winter", 2022)], top_n=top_n)
 
         fig, axes = plt.subplots(1, 3, figsize=(20, 7))
         datasets = [